@@ -0,0 +1,240 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+import deadlines
+import metrics
+import upstream
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+# Per student (X-Student-Id header) or client IP token bucket, charged only
+# for requests that reach the model. 0 turns it off: without X-Student-Id a
+# whole class behind one NAT or load balancer would share a single bucket
+ADMISSION_RATE = float(os.getenv("ADMISSION_RATE", "0"))  # tokens per second
+ADMISSION_BURST = float(os.getenv("ADMISSION_BURST", "5"))
+ADMISSION_MAX_CLIENTS = int(os.getenv("ADMISSION_MAX_CLIENTS", "10000"))
+# Honour X-Forwarded-For when running behind a proxy that sets it
+ADMISSION_TRUST_FORWARDED = os.getenv("ADMISSION_TRUST_FORWARDED", "0") == "1"
+# Upstream calls running at once, and calls allowed to wait for a slot
+ADMISSION_MAX_ACTIVE = int(os.getenv("ADMISSION_MAX_ACTIVE", str(upstream.UPSTREAM_MAX_IN_FLIGHT)))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "512"))
+# A submission for a question the same client asked about this recently is a retry
+ADMISSION_RETRY_WINDOW = float(os.getenv("ADMISSION_RETRY_WINDOW", "120"))
+
+# Priority classes, lower runs first
+FIRST_ATTEMPT, RETRY = 0, 1
+_PRIORITY_NAMES = {FIRST_ATTEMPT: "first_attempt", RETRY: "retry"}
+
+
+class Rejected(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Request rejected: {reason}")
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def client_key(request, student_id=None):
+    if student_id:
+        return f"student:{student_id}"
+    if ADMISSION_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return f"ip:{forwarded.split(',')[0].strip()}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+class TokenBuckets:
+    """Token bucket per client, forgetting the least recently seen clients."""
+
+    def __init__(self, rate, burst, max_clients):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()  # client -> (tokens, updated_at)
+
+    def take(self, client):
+        """Spend one token; return 0 when admitted, else seconds to wait."""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate if self.rate > 0 else 60.0
+        self._buckets[client] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class RecentQuestions:
+    """Remembers which (client, question) pairs were submitted recently."""
+
+    def __init__(self, window, max_entries):
+        self.window = window
+        self.max_entries = max_entries
+        self._seen = OrderedDict()
+
+    def priority(self, client, question_id):
+        now = time.monotonic()
+        key = (client, question_id)
+        seen_at = self._seen.pop(key, None)
+        self._seen[key] = now
+        while len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+        if seen_at is not None and now - seen_at < self.window:
+            return RETRY
+        return FIRST_ATTEMPT
+
+
+class UpstreamQueue:
+    """Bounded priority queue in front of the upstream calls.
+
+    At most `max_active` calls run; up to `max_queue` more wait, first
+    attempts ahead of retries. A first attempt arriving at a full queue
+    takes the place of the newest waiting retry.
+    """
+
+    def __init__(self, max_active, max_queue):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.active = 0
+        self._waiting = []  # heap of [priority, sequence, future]
+        self._sequence = itertools.count()
+        self._depth = {FIRST_ATTEMPT: 0, RETRY: 0}
+        self._service_time = 5.0  # moving average of seconds a slot is held
+
+    def depth(self):
+        return sum(self._depth.values())
+
+    def _set_depth(self, priority, change):
+        self._depth[priority] += change
+        metrics.ADMISSION_QUEUE_DEPTH.labels(priority=_PRIORITY_NAMES[priority]).set(self._depth[priority])
+
+    def retry_after(self):
+        # Time for the calls ahead to drain through the active slots
+        return (self.depth() + 1) * self._service_time / max(1, self.max_active)
+
+    def has_room(self, priority=FIRST_ATTEMPT):
+        if self.active < self.max_active or self.depth() < self.max_queue:
+            return True
+        return priority == FIRST_ATTEMPT and self._depth[RETRY] > 0
+
+    def _evict_retry(self):
+        waiting_retries = [entry for entry in self._waiting if entry[0] == RETRY and not entry[2].done()]
+        newest = max(waiting_retries, key=lambda entry: entry[1])
+        newest[2].set_exception(Rejected("evicted", self.retry_after()))
+        self._set_depth(RETRY, -1)
+        metrics.ADMISSION_REJECTIONS.labels(reason="evicted").inc()
+
+    async def acquire(self, priority):
+        if self.active < self.max_active and not self.depth():
+            self.active += 1
+            return
+        if self.depth() >= self.max_queue:
+            if priority != FIRST_ATTEMPT or not self._depth[RETRY]:
+                metrics.ADMISSION_REJECTIONS.labels(reason="queue_full").inc()
+                raise Rejected("queue_full", self.retry_after())
+            self._evict_retry()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, [priority, next(self._sequence), future])
+        self._set_depth(priority, 1)
+        started = time.perf_counter()
+        try:
+            await future
+        except Rejected:
+            raise
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up: pass it on
+                self.release()
+            else:
+                self._set_depth(priority, -1)
+            raise
+        finally:
+            metrics.ADMISSION_WAIT_SECONDS.labels(priority=_PRIORITY_NAMES[priority]).observe(time.perf_counter() - started)
+
+    def release(self):
+        while self._waiting:
+            priority, _, future = heapq.heappop(self._waiting)
+            if future.done():
+                continue
+            # Hand the slot straight to the next waiter
+            self._set_depth(priority, -1)
+            future.set_result(None)
+            return
+        self.active -= 1
+
+    def observe_service_time(self, seconds):
+        self._service_time = 0.9 * self._service_time + 0.1 * seconds
+
+
+_buckets = TokenBuckets(ADMISSION_RATE, ADMISSION_BURST, ADMISSION_MAX_CLIENTS)
+_recent = RecentQuestions(ADMISSION_RETRY_WINDOW, ADMISSION_MAX_CLIENTS)
+_queue = UpstreamQueue(ADMISSION_MAX_ACTIVE, ADMISSION_MAX_QUEUE)
+
+
+def priority(client, question_id):
+    """Priority class of a request: a retry when the client asked about the
+    same question within ADMISSION_RETRY_WINDOW."""
+    if not ADMISSION_ENABLED:
+        return FIRST_ATTEMPT
+    return _recent.priority(client, question_id)
+
+
+def charge(client, priority=FIRST_ATTEMPT):
+    """Charge the client's bucket for a request about to go upstream.
+
+    Raises Rejected when the client is over its rate or the upstream queue
+    cannot take the request.
+    """
+    if not ADMISSION_ENABLED:
+        return
+    if ADMISSION_RATE > 0:
+        wait = _buckets.take(client)
+        if wait > 0:
+            metrics.ADMISSION_REJECTIONS.labels(reason="rate_limited").inc()
+            raise Rejected("rate_limited", wait)
+    if not _queue.has_room(priority):
+        metrics.ADMISSION_REJECTIONS.labels(reason="queue_full").inc()
+        raise Rejected("queue_full", _queue.retry_after())
+
+
+def admit(client, question_id=None):
+    """Classify and charge a request that will certainly go upstream (a
+    queued job). Returns the priority class or raises Rejected."""
+    request_priority = priority(client, question_id) if question_id else FIRST_ATTEMPT
+    charge(client, request_priority)
+    return request_priority
+
+
+@asynccontextmanager
+async def upstream_slot(priority=FIRST_ATTEMPT):
+    """Hold one of the ADMISSION_MAX_ACTIVE upstream slots."""
+    deadlines.check("admission")
+    if not ADMISSION_ENABLED:
+        yield
+        return
+    left = deadlines.remaining()
+    if left is None:
+        await _queue.acquire(priority)
+    else:
+        try:
+            await asyncio.wait_for(_queue.acquire(priority), left)
+        except asyncio.TimeoutError:
+            # Gave up waiting in the queue; the call never starts
+            raise deadlines.exceeded("admission_queue")
+    metrics.ADMISSION_ACTIVE.set(_queue.active)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _queue.observe_service_time(time.perf_counter() - started)
+        _queue.release()
+        metrics.ADMISSION_ACTIVE.set(_queue.active)
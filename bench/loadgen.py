@@ -0,0 +1,225 @@
+"""Load generator replaying realistic submissions against the backend.
+
+    python -m bench.loadgen --url http://127.0.0.1:8000 --requests 500 --concurrency 32
+
+Each submission pairs a question from questions.csv with a typical student
+query and a variant of the reference solution (unchanged, renamed, broken
+logic or a syntax error), so the cache, diagnostics and sandbox paths all
+see traffic. ``--repeat-ratio`` resends earlier submissions to exercise the
+cache; ``--stream-ratio`` sends that share through /api/submit/stream.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+import time
+
+import httpx
+
+import question_store
+from question_parsing import split_solution
+
+CODING_QUERIES = [
+    "how do I start?",
+    "why is my output wrong?",
+    "I am getting an error, please help",
+    "test case 2 is failing, what is wrong in my code?",
+    "my code works for the sample input but fails the hidden test cases",
+    "can you check my logic?",
+    "how do I take the input and convert it to an integer?",
+    "what is wrong in my loop?",
+]
+PORTAL_QUERIES = [
+    "when will I get my certificate?",
+    "my session is locked, how do I unlock it?",
+]
+
+
+def _rename_variables(code, rng):
+    names = sorted(set(re.findall(r"^\s*([a-z_][a-z0-9_]*)\s*=", code, re.M)))
+    for name in names:
+        code = re.sub(rf"\b{name}\b", f"{name}_{rng.randint(1, 9)}", code)
+    return code
+
+
+def _break_logic(code, rng):
+    lines = code.splitlines()
+    if len(lines) > 2:
+        del lines[rng.randrange(1, len(lines))]
+    return "\n".join(lines)
+
+
+def _break_syntax(code, rng):
+    return re.sub(r":\s*$", "", code, count=1, flags=re.M)
+
+
+def code_variant(solution, rng):
+    mutate = rng.choices(
+        [lambda code, rng: code, _rename_variables, _break_logic, _break_syntax],
+        weights=[3, 3, 3, 1],
+    )[0]
+    return mutate(solution, rng) or solution
+
+
+def load_submissions(csv_path=question_store.QUESTIONS_CSV_PATH):
+    questions = []
+    for question_id, details in question_store._read_csv(csv_path).items():
+        _, solution = split_solution(details)
+        if solution:
+            questions.append((question_id, solution))
+    return questions
+
+
+class Workload:
+    def __init__(self, questions, seed=None, repeat_ratio=0.2, portal_ratio=0.05, stream_ratio=0.0, students=200):
+        self.questions = questions
+        self.rng = random.Random(seed)
+        self.repeat_ratio = repeat_ratio
+        self.portal_ratio = portal_ratio
+        self.stream_ratio = stream_ratio
+        self.students = students
+        self.sent = []
+
+    def next(self):
+        """Return (student_id, stream, payload) for the next request."""
+        rng = self.rng
+        student = f"bench-{rng.randrange(self.students)}"
+        stream = rng.random() < self.stream_ratio
+        if self.sent and rng.random() < self.repeat_ratio:
+            return student, stream, rng.choice(self.sent)
+        question_id, solution = rng.choice(self.questions)
+        if rng.random() < self.portal_ratio:
+            query = rng.choice(PORTAL_QUERIES)
+        else:
+            query = rng.choice(CODING_QUERIES)
+        payload = {"questionId": question_id, "query": query, "code": code_variant(solution, rng)}
+        self.sent.append(payload)
+        return student, stream, payload
+
+
+async def _submit(client, url, student, stream, payload):
+    headers = {"X-Student-Id": student}
+    started = time.perf_counter()
+    first_byte = None
+    status = None
+    source = None
+    try:
+        if stream:
+            async with client.stream("POST", f"{url}/api/submit/stream", json=payload, headers=headers) as response:
+                status = response.status_code
+                async for line in response.aiter_lines():
+                    if first_byte is None and line.startswith("data:"):
+                        first_byte = time.perf_counter() - started
+                    if line.startswith("event: error"):
+                        status = "stream_error"
+        else:
+            response = await client.post(f"{url}/api/submit", json=payload, headers=headers)
+            status = response.status_code
+            if response.headers.get("x-degraded"):
+                source = "degraded"
+            elif response.headers.get("x-fast-path"):
+                source = response.headers["x-fast-path"]
+            elif response.headers.get("x-cache") == "HIT":
+                source = "cache"
+            else:
+                source = "upstream"
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    elapsed = time.perf_counter() - started
+    return {
+        "stream": stream,
+        "status": status,
+        "latency": elapsed,
+        "ttft": first_byte if first_byte is not None else elapsed,
+        "source": source,
+    }
+
+
+async def run_load(url, workload, requests, concurrency=32, rate=None, timeout=300):
+    """Send `requests` submissions, closed-loop at `concurrency` or open-loop
+    at `rate` requests/s (Poisson arrivals). Returns the per-request samples."""
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2)
+    samples = []
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        if rate:
+            tasks = []
+            for _ in range(requests):
+                tasks.append(asyncio.create_task(_submit(client, url, *workload.next())))
+                await asyncio.sleep(workload.rng.expovariate(rate))
+            samples = await asyncio.gather(*tasks)
+        else:
+            remaining = iter(range(requests))
+
+            async def worker():
+                for _ in remaining:
+                    samples.append(await _submit(client, url, *workload.next()))
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples, elapsed):
+    ok = [sample for sample in samples if sample["status"] == 200]
+    latencies = [sample["latency"] for sample in ok]
+    ttfts = [sample["ttft"] for sample in ok]
+    statuses = {}
+    for sample in samples:
+        statuses[str(sample["status"])] = statuses.get(str(sample["status"]), 0) + 1
+    sources = {}
+    for sample in ok:
+        if sample["source"]:
+            sources[sample["source"]] = sources.get(sample["source"], 0) + 1
+    return {
+        "requests": len(samples),
+        "succeeded": len(ok),
+        "elapsed_seconds": elapsed,
+        "requests_per_second": len(samples) / elapsed if elapsed else None,
+        "latency_seconds": {
+            "p50": percentile(latencies, 0.5),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": max(latencies) if latencies else None,
+        },
+        "ttft_seconds": {
+            "p50": percentile(ttfts, 0.5),
+            "p95": percentile(ttfts, 0.95),
+            "p99": percentile(ttfts, 0.99),
+        },
+        "statuses": statuses,
+        "sources": sources,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rate", type=float, default=None, help="open-loop arrivals per second")
+    parser.add_argument("--repeat-ratio", type=float, default=0.2)
+    parser.add_argument("--portal-ratio", type=float, default=0.05)
+    parser.add_argument("--stream-ratio", type=float, default=0.0)
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    workload = Workload(
+        load_submissions(), args.seed, args.repeat_ratio, args.portal_ratio, args.stream_ratio, args.students
+    )
+    started = time.perf_counter()
+    samples = asyncio.run(run_load(args.url, workload, args.requests, args.concurrency, args.rate))
+    json.dump(summarize(samples, time.perf_counter() - started), sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
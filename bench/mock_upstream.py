@@ -0,0 +1,160 @@
+"""OpenAI-compatible mock of the upstream model for offline benchmarks.
+
+    python -m bench.mock_upstream --port 9100 --latency lognormal:2,0.5 \
+        --chunk-rate 50 --error-rate 0.01 --rate-limit-rate 0.01
+
+Latency specs: ``fixed:SECONDS``, ``uniform:LOW,HIGH``, ``lognormal:MEDIAN,SIGMA``
+or ``exponential:MEAN``. For streamed calls the sampled latency is the time
+to the first chunk; the rest of the answer follows at ``--chunk-rate``.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANSWER = """<query_and_code_analysis>
+The student asked about question {digest}. Walking through the code line by
+line, reading the inputs, checking each branch and comparing the printed
+output against the expected output of the examples.
+</query_and_code_analysis>
+<StudentResponse>
+Hi,
+
+From your code I observed that:
+
+**Mistake-1**: The value read with `input()` is a string, so it must be converted with `int()` before comparing.
+
+```python
+value = int(input())
+```
+
+**Approach**: Convert the inputs first, then compare them and print the result for each case.
+
+Mark the discussion as clarified if your issue is resolved.
+
+Happy Coding!
+</StudentResponse>"""
+
+
+def parse_latency(spec):
+    """Return a function sampling seconds from a latency spec."""
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",") if value]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda rng: rng.lognormvariate(math.log(median), sigma)
+    if kind == "exponential":
+        return lambda rng: rng.expovariate(1 / values[0])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def create_app(latency="lognormal:1.5,0.5", chunk_rate=40.0, chunk_size=12, error_rate=0.0,
+               rate_limit_rate=0.0, retry_after=1.0, seed=None):
+    app = FastAPI()
+    rng = random.Random(seed)
+    sample_latency = parse_latency(latency)
+    stats = {"requests": 0, "streamed": 0, "errors": 0, "rate_limited": 0}
+
+    def answer_for(body):
+        digest = hashlib.sha256(json.dumps(body.get("messages"), sort_keys=True).encode("utf-8")).hexdigest()
+        return ANSWER.format(digest=digest[:12])
+
+    def injected_error():
+        draw = rng.random()
+        if draw < rate_limit_rate:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit exceeded", "type": "rate_limit"}},
+                status_code=429,
+                headers={"Retry-After": str(retry_after)},
+            )
+        if draw < rate_limit_rate + error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"message": "Injected failure", "type": "server_error"}}, status_code=500)
+        return None
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        error = injected_error()
+        if error is not None:
+            return error
+        text = answer_for(body)
+        delay = sample_latency(rng)
+        created = int(time.time())
+        if not body.get("stream"):
+            await asyncio.sleep(delay)
+            return {
+                "id": "mock",
+                "object": "chat.completion",
+                "created": created,
+                "model": body["model"],
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+                ],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(text) // 4, "total_tokens": len(text) // 4},
+            }
+
+        stats["streamed"] += 1
+
+        async def chunks():
+            await asyncio.sleep(delay)
+            for start in range(0, len(text), chunk_size):
+                chunk = {
+                    "id": "mock",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": body["model"],
+                    "choices": [{"index": 0, "delta": {"content": text[start:start + chunk_size]}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                if chunk_rate > 0:
+                    await asyncio.sleep(1 / chunk_rate)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "mock", "object": "model"}]}
+
+    @app.get("/stats")
+    async def mock_stats():
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", default="lognormal:1.5,0.5")
+    parser.add_argument("--chunk-rate", type=float, default=40.0, help="chunks per second after the first")
+    parser.add_argument("--chunk-size", type=int, default=12, help="characters per chunk")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of calls failing with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    app = create_app(
+        args.latency, args.chunk_rate, args.chunk_size, args.error_rate,
+        args.rate_limit_rate, args.retry_after, args.seed,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
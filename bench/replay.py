@@ -0,0 +1,182 @@
+"""Replay captured traffic (CAPTURE_ENABLED=1) against a backend, or offline.
+
+    python -m bench.replay captures/ --url http://127.0.0.1:8000 --speed 1
+    python -m bench.replay captures/capture-*.jsonl.gz --speed 20 --limit 5000
+    python -m bench.replay captures/ --simulate --ttl 86400
+
+Requests are re-sent open-loop at their captured inter-arrival times
+divided by --speed, from the same (pseudonymous) students and to the same
+endpoint, so admission, coalescing and the cache see the production
+pattern. Point the backend at bench.mock_upstream to keep it offline. The
+report puts the replayed latency and response sources next to the
+captured ones.
+
+--simulate sends nothing: it runs the log through the current out-of-scope
+classifier and cache keys (exact and fingerprint) to estimate the hit rates
+a change to either would have had.
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+import httpx
+
+import capture
+import question_store
+from bench import loadgen
+from cache import CACHE_TTL_SECONDS, make_fingerprint_key, make_key
+from classifier import is_out_of_scope
+from fingerprint import fingerprint_code
+
+
+def capture_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "capture-*.jsonl.gz"))))
+        else:
+            files.append(path)
+    return files
+
+
+def _payload(record):
+    return {"questionId": record["questionId"], "query": record["query"], "code": record["code"]}
+
+
+async def replay(url, records, speed=1.0, timeout=300, max_connections=512):
+    """Send every record at its captured offset / `speed`. Returns the
+    per-request samples and how late the sends were against the schedule."""
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    first = records[0]["ts"]
+    lags = []
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        tasks = []
+        for record in records:
+            due = (record["ts"] - first) / speed
+            delay = due - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lags.append(max(0.0, time.perf_counter() - started - due))
+            stream = record["endpoint"] == "stream"
+            tasks.append(
+                asyncio.create_task(loadgen._submit(client, url, record["student"], stream, _payload(record)))
+            )
+        samples = await asyncio.gather(*tasks)
+    return samples, lags
+
+
+def _source(record):
+    # Named as bench.loadgen names the replayed responses
+    if record["fastPath"]:
+        return record["fastPath"]
+    return "upstream" if record["source"] == "model" else record["source"]
+
+
+def captured_summary(records):
+    ok = [record for record in records if record["status"] == 200]
+    latencies = [record["latencySeconds"] for record in ok]
+    span = records[-1]["ts"] - records[0]["ts"]
+    return {
+        "requests": len(records),
+        "succeeded": len(ok),
+        "span_seconds": span,
+        "requests_per_second": len(records) / span if span else None,
+        "latency_seconds": {
+            "p50": loadgen.percentile(latencies, 0.5),
+            "p95": loadgen.percentile(latencies, 0.95),
+            "p99": loadgen.percentile(latencies, 0.99),
+        },
+        "statuses": dict(Counter(str(record["status"]) for record in records)),
+        # Only /api/submit responses say where they came from when replayed
+        "sources": dict(Counter(_source(record) for record in ok if record["endpoint"] == "submit")),
+    }
+
+
+def simulate(records, ttl=CACHE_TTL_SECONDS, questions=None):
+    """Outcome counts of the local stages the log would see today: answered
+    by the classifier, exact or fingerprint cache hit, or sent upstream (and
+    cached for `ttl` seconds). `questions` gives the classifier the question
+    context the backend has."""
+    outcomes = Counter()
+    expires = {}  # cache key -> captured time it expires at
+    for record in records:
+        if record["status"] == "not_found":
+            continue
+        details = questions.get(record["questionId"]) if questions is not None else None
+        if is_out_of_scope(record["query"], details) is not None:
+            outcomes["out_of_scope"] += 1
+            continue
+        now = record["ts"]
+        exact_key = make_key(record["questionId"], record["query"], record["code"])
+        if expires.get(exact_key, 0) > now:
+            outcomes["exact_hit"] += 1
+            continue
+        fingerprint = fingerprint_code(record["code"])
+        fingerprint_key = make_fingerprint_key(record["questionId"], record["query"], fingerprint.digest)
+        if expires.get(fingerprint_key, 0) > now:
+            outcomes["fingerprint_hit"] += 1
+            continue
+        outcomes["upstream"] += 1
+        expires[exact_key] = expires[fingerprint_key] = now + ttl
+    total = sum(outcomes.values())
+    captured = Counter(record["source"] for record in records if record["source"])
+    return {
+        "requests": total,
+        "outcomes": dict(outcomes),
+        "cache_hit_rate": (outcomes["exact_hit"] + outcomes["fingerprint_hit"]) / total if total else None,
+        "captured_sources": dict(captured),
+        "captured_cache_hit_rate": captured["cache"] / sum(captured.values()) if captured else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="capture files or directories")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression; 10 replays 10x faster")
+    parser.add_argument("--limit", type=int, default=None, help="replay only the first N requests")
+    parser.add_argument("--endpoint", choices=["submit", "stream"], default=None, help="replay one endpoint only")
+    parser.add_argument("--simulate", action="store_true", help="estimate classifier and cache outcomes offline")
+    parser.add_argument("--ttl", type=float, default=CACHE_TTL_SECONDS, help="cache TTL for --simulate")
+    parser.add_argument("--output", default=None, help="also write the JSON report here")
+    args = parser.parse_args()
+
+    records = capture.read(capture_files(args.paths))
+    if args.endpoint:
+        records = [record for record in records if record["endpoint"] == args.endpoint]
+    records = records[:args.limit]
+    if not records:
+        sys.exit("no captured requests found")
+
+    if args.simulate:
+        questions = question_store.open_store()
+        try:
+            report = simulate(records, args.ttl, questions)
+        finally:
+            questions.close()
+    else:
+        started = time.perf_counter()
+        samples, lags = asyncio.run(replay(args.url, records, args.speed))
+        report = {
+            "config": {"speed": args.speed, "requests": len(records)},
+            "results": loadgen.summarize(samples, time.perf_counter() - started),
+            "captured": captured_summary(records),
+            "schedule_lag_seconds": {"p50": loadgen.percentile(lags, 0.5), "max": max(lags)},
+            "samples": samples,
+        }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    report.pop("samples", None)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""Offline benchmark: mock upstream + backend + load generator.
+
+    python -m bench.run --requests 500 --concurrency 64 --latency lognormal:2,0.5
+
+Starts bench.mock_upstream and the backend (uvicorn, fresh cache and
+question store in a temporary directory), replays a submission mix with
+bench.loadgen, samples the backend worker's CPU and RSS from /proc and
+writes everything to a JSON report. Nothing leaves the machine.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+from bench import loadgen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with status {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def _proc_sample(pid):
+    """(cpu seconds, rss bytes) of one process, from /proc."""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    with open(f"/proc/{pid}/statm") as f:
+        rss_pages = int(f.read().split()[1])
+    # utime and stime are fields 14 and 15; fields[0] is field 3
+    return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS, rss_pages * _PAGE_SIZE
+
+
+class ResourceSampler(threading.Thread):
+    """Samples a process's CPU and RSS every `interval` seconds."""
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []  # (elapsed, cpu seconds, rss bytes)
+        self._finished = threading.Event()
+
+    def run(self):
+        started = time.monotonic()
+        while not self._finished.is_set():
+            try:
+                cpu, rss = _proc_sample(self.pid)
+            except (OSError, IndexError, ValueError):
+                break
+            self.samples.append((time.monotonic() - started, cpu, rss))
+            self._finished.wait(self.interval)
+
+    def stop(self):
+        self._finished.set()
+        self.join()
+
+    def summary(self):
+        if len(self.samples) < 2:
+            return None
+        (first_at, first_cpu, _), (last_at, last_cpu, _) = self.samples[0], self.samples[-1]
+        rss = [sample[2] for sample in self.samples]
+        return {
+            "cpu_seconds": last_cpu - first_cpu,
+            "cpu_utilization": (last_cpu - first_cpu) / (last_at - first_at),
+            "rss_bytes": {"start": rss[0], "end": rss[-1], "max": max(rss)},
+        }
+
+
+def _env_overrides(pairs):
+    overrides = {}
+    for pair in pairs:
+        name, _, value = pair.partition("=")
+        overrides[name] = value
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rate", type=float, default=None, help="open-loop arrivals per second")
+    parser.add_argument("--repeat-ratio", type=float, default=0.2)
+    parser.add_argument("--portal-ratio", type=float, default=0.05)
+    parser.add_argument("--stream-ratio", type=float, default=0.2)
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency", default="lognormal:1.5,0.5", help="mock upstream latency distribution")
+    parser.add_argument("--chunk-rate", type=float, default=40.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the backend")
+    parser.add_argument(
+        "--backend-env", action="append", default=[], metavar="NAME=VALUE",
+        help="extra environment for the backend, e.g. ADMISSION_ENABLED=0",
+    )
+    parser.add_argument("--output", default=os.path.join(ROOT, "bench_results.json"))
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="pymebot-bench-")
+    mock_port, backend_port = free_port(), free_port()
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    backend_url = f"http://127.0.0.1:{backend_port}"
+    mock_command = [
+        sys.executable, "-m", "bench.mock_upstream", "--port", str(mock_port), "--latency", args.latency,
+        "--chunk-rate", str(args.chunk_rate), "--error-rate", str(args.error_rate),
+        "--rate-limit-rate", str(args.rate_limit_rate), "--seed", str(args.seed),
+    ]
+    backend_env = {
+        **os.environ,
+        "OPENROUTER_BASE_URL": f"{mock_url}/v1",
+        "OPENROUTER_API_KEY": "bench",
+        "UPSTREAM_MODELS": f"mock@{mock_url}/v1",
+        "CACHE_DB_PATH": os.path.join(workdir, "response_cache.sqlite3"),
+        "QUESTIONS_STORE_PATH": os.path.join(workdir, "questions.store"),
+        # The whole load comes from one machine: keep the per-client buckets
+        # out of the way unless a run asks for them
+        "ADMISSION_RATE": "1000",
+        "ADMISSION_BURST": "1000",
+        **_env_overrides(args.backend_env),
+    }
+    if args.workers > 1:
+        # One /metrics view over every worker
+        backend_env.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(workdir, "metrics"))
+        os.makedirs(backend_env["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+    backend_command = [
+        sys.executable, "-m", "uvicorn", "backend:app", "--port", str(backend_port),
+        "--workers", str(args.workers), "--log-level", "warning",
+    ]
+
+    processes = []
+    try:
+        mock = subprocess.Popen(mock_command, cwd=ROOT)
+        processes.append(mock)
+        wait_ready(f"{mock_url}/v1/models", mock)
+        backend = subprocess.Popen(backend_command, cwd=ROOT, env=backend_env)
+        processes.append(backend)
+        wait_ready(f"{backend_url}/metrics", backend)
+
+        # With --workers the uvicorn parent only supervises; sample its children
+        pids = [backend.pid]
+        if args.workers > 1:
+            children = f"/proc/{backend.pid}/task/{backend.pid}/children"
+            with open(children) as f:
+                pids = [int(pid) for pid in f.read().split()] or pids
+        samplers = [ResourceSampler(pid) for pid in pids]
+        for sampler in samplers:
+            sampler.start()
+
+        workload = loadgen.Workload(
+            loadgen.load_submissions(), args.seed, args.repeat_ratio, args.portal_ratio,
+            args.stream_ratio, args.students,
+        )
+        started = time.perf_counter()
+        samples = asyncio.run(loadgen.run_load(backend_url, workload, args.requests, args.concurrency, args.rate))
+        elapsed = time.perf_counter() - started
+        for sampler in samplers:
+            sampler.stop()
+        mock_stats = httpx.get(f"{mock_url}/stats").json()
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": loadgen.summarize(samples, elapsed),
+        "workers": [sampler.summary() for sampler in samplers],
+        "upstream": mock_stats,
+        "samples": samples,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    results = report["results"]
+    print(f"{results['requests']} requests in {elapsed:.1f}s: {results['requests_per_second']:.1f} req/s, "
+          f"{results['succeeded']} succeeded, upstream calls {mock_stats['requests']}")
+    for name in ("latency_seconds", "ttft_seconds"):
+        values = results[name]
+        print(f"{name}: " + ", ".join(
+            f"{key}={value:.3f}" for key, value in values.items() if value is not None
+        ))
+    for pid, summary in zip(pids, report["workers"]):
+        if summary:
+            print(f"worker {pid}: cpu {summary['cpu_utilization']:.0%}, "
+                  f"rss max {summary['rss_bytes']['max'] / 2 ** 20:.0f} MiB")
+    print(f"report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
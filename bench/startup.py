@@ -0,0 +1,161 @@
+"""Cold-start benchmark: import-to-live, import-to-ready and first answer.
+
+    python -m bench.startup --runs 5 --mode background --mode blocking --mode off
+
+Each run starts a fresh backend process against bench.mock_upstream and
+times, from the moment the process is spawned, the first 200 from /healthz
+(accepting requests), the first 200 from /readyz (warm) and the first
+answer to a submission that has to go upstream. The backend's own
+pymebot_startup_seconds gauges are read back from /metrics. With
+--drop-caches the page cache is dropped before each run (needs root), which
+is closest to a host waking up from sleep.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench import loadgen
+from bench.run import ROOT, free_port, wait_ready
+
+
+def _poll(url, process, timeout=60):
+    """Wait until `url` answers 200, polling every 10 ms."""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"backend exited with status {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"{url} not ready within {timeout}s")
+
+
+def _startup_gauges(backend_url):
+    gauges = {}
+    for line in httpx.get(f"{backend_url}/metrics").text.splitlines():
+        if line.startswith("pymebot_startup_seconds{"):
+            phase = line.split('phase="', 1)[1].split('"', 1)[0]
+            gauges[phase] = float(line.rsplit(" ", 1)[1])
+    return gauges
+
+
+def _drop_caches():
+    try:
+        subprocess.run(["sync"], check=True)
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+    except OSError as e:
+        print(f"cannot drop the page cache: {e}", file=sys.stderr)
+
+
+def cold_start(mode, mock_url, submission, workdir, drop_caches=False):
+    port = free_port()
+    backend_url = f"http://127.0.0.1:{port}"
+    env = {
+        **os.environ,
+        "STARTUP_WARMUP": mode,
+        "OPENROUTER_BASE_URL": f"{mock_url}/v1",
+        "OPENROUTER_API_KEY": "bench",
+        "UPSTREAM_MODELS": f"mock@{mock_url}/v1",
+        "CACHE_DB_PATH": os.path.join(workdir, f"cache-{port}.sqlite3"),
+        "JOBS_DB_PATH": os.path.join(workdir, f"jobs-{port}.sqlite3"),
+        "GUIDANCE_ENABLED": "0",
+    }
+    if drop_caches:
+        _drop_caches()
+    command = [sys.executable, "-m", "uvicorn", "backend:app", "--port", str(port), "--log-level", "warning"]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env=env)
+    try:
+        _poll(f"{backend_url}/healthz", process)
+        live = time.perf_counter() - started
+        _poll(f"{backend_url}/readyz", process)
+        ready = time.perf_counter() - started
+        response = httpx.post(f"{backend_url}/api/submit", json=submission, timeout=120)
+        response.raise_for_status()
+        first_answer = time.perf_counter() - started
+        gauges = _startup_gauges(backend_url)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return {
+        "live_seconds": live,
+        "ready_seconds": ready,
+        "first_answer_seconds": first_answer,
+        "import_seconds": gauges.get("import"),
+        "import_to_ready_seconds": gauges.get("ready"),
+    }
+
+
+def _summary(runs):
+    return {
+        name: {
+            "median": statistics.median(values),
+            "min": min(values),
+            "max": max(values),
+        }
+        for name in runs[0]
+        if (values := [run[name] for run in runs if run[name] is not None])
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument(
+        "--mode", action="append", choices=["background", "blocking", "off"],
+        help="STARTUP_WARMUP values to compare (default: background)",
+    )
+    parser.add_argument("--latency", default="fixed:0.2", help="mock upstream latency distribution")
+    parser.add_argument("--drop-caches", action="store_true")
+    parser.add_argument("--output", default=os.path.join(ROOT, "bench_startup.json"))
+    args = parser.parse_args()
+    modes = args.mode or ["background"]
+
+    # A submission the local stages cannot answer: the first answer includes
+    # the upstream client and connection
+    question_id, solution = loadgen.load_submissions()[0]
+    submission = {"questionId": question_id, "query": "why is my output wrong?", "code": solution}
+
+    workdir = tempfile.mkdtemp(prefix="pymebot-startup-")
+    mock_url = f"http://127.0.0.1:{free_port()}"
+    mock = subprocess.Popen(
+        [sys.executable, "-m", "bench.mock_upstream", "--port", mock_url.rsplit(":", 1)[1], "--latency", args.latency],
+        cwd=ROOT,
+    )
+    report = {}
+    try:
+        wait_ready(f"{mock_url}/v1/models", mock)
+        for mode in modes:
+            runs = [cold_start(mode, mock_url, submission, workdir, args.drop_caches) for _ in range(args.runs)]
+            report[mode] = {"summary": _summary(runs), "runs": runs}
+    finally:
+        mock.terminate()
+        mock.wait(timeout=10)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    for mode, result in report.items():
+        print(f"{mode}: " + ", ".join(
+            f"{name}={values['median']:.3f}" for name, values in result["summary"].items()
+        ))
+    print(f"report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import os
+import time
+
+import classifier
+import curriculum
+import metrics
+import resilience
+from question_parsing import split_solution
+from streaming import ANALYSIS_BLOCK, CLOSE_TAG, OPEN_TAG
+
+COMPLETION_BUDGETS_ENABLED = os.getenv("COMPLETION_BUDGETS_ENABLED", "1") == "1"
+# max_tokens per predicted query category. The <query_and_code_analysis>
+# block the prompt requires comes first and counts against it (as does a
+# reasoning model's own scratchpad), so these leave room for a full analysis
+# plus the answer; they cap runaway generations rather than trim answers
+COMPLETION_BUDGETS = {
+    "out_of_scope": int(os.getenv("COMPLETION_BUDGET_OUT_OF_SCOPE", "2048")),
+    "implementation_guidance": int(os.getenv("COMPLETION_BUDGET_IMPLEMENTATION_GUIDANCE", "8192")),
+    "code_review": int(os.getenv("COMPLETION_BUDGET_CODE_REVIEW", "6144")),
+}
+# Also pass </StudentResponse> as a provider-side stop sequence. Off by
+# default: the prompt's own checklist mentions the tag, so a model that
+# echoes it in its analysis would be cut off before answering; the stream
+# is ended locally once the tag arrives after <StudentResponse> instead
+COMPLETION_STOP_SEQUENCE = os.getenv("COMPLETION_STOP_SEQUENCE", "0") == "1"
+# One short follow-up call when an answer comes back without its tags
+COMPLETION_REPAIR_ENABLED = os.getenv("COMPLETION_REPAIR_ENABLED", "1") == "1"
+COMPLETION_REPAIR_BUDGET = int(os.getenv("COMPLETION_REPAIR_BUDGET", "1024"))
+# Queries the classifier leans towards portal/administrative without being
+# sure enough to answer them locally
+OUT_OF_SCOPE_HINT = float(os.getenv("COMPLETION_OUT_OF_SCOPE_HINT", "0.5"))
+# Code with fewer lines than this share of the reference solution is partial
+PARTIAL_CODE_RATIO = float(os.getenv("COMPLETION_PARTIAL_CODE_RATIO", "0.4"))
+
+# Answers complete enough to be cached and served again
+CACHEABLE_OUTCOMES = ("well_formed", "repaired")
+
+REPAIR_INSTRUCTION = (
+    "Your reply above is missing the <StudentResponse> tags. Reply again with only the "
+    "answer for the student, wrapped between <StudentResponse> and </StudentResponse>, "
+    "in under 500 words. Do not repeat the analysis."
+)
+
+
+class EmptyAnswer(resilience.UpstreamUnavailable):
+    """The model's reply, repaired or not, had nothing for the student, e.g.
+    the budget ran out inside the analysis block."""
+
+    def __init__(self, category):
+        super().__init__(f"empty {category} answer", 1)
+
+
+def _code_lines(code):
+    return [line for line in code.splitlines() if line.strip() and not line.strip().startswith("#")]
+
+
+def categorize(query, code, question_details):
+    """Predict the prompt's query category before calling the model:
+    "out_of_scope", "implementation_guidance" (no or partial code) or
+    "code_review" for the rest."""
+    if (
+        classifier.CLASSIFIER_ENABLED
+        and classifier.classify(query, question_details).confidence >= OUT_OF_SCOPE_HINT
+    ):
+        return "out_of_scope"
+    lines = len(_code_lines(code))
+    _, solution = split_solution(question_details)
+    reference = len(_code_lines(solution))
+    if lines == 0 or (reference and lines < PARTIAL_CODE_RATIO * reference):
+        return "implementation_guidance"
+    return "code_review"
+
+
+def params(category):
+    """Extra arguments for the upstream call of a `category` query."""
+    if not COMPLETION_BUDGETS_ENABLED:
+        return {}
+    extra = {"max_tokens": COMPLETION_BUDGETS[category]}
+    if COMPLETION_STOP_SEQUENCE:
+        extra["stop"] = [CLOSE_TAG]
+    return extra
+
+
+def repair_params():
+    extra = {"max_tokens": COMPLETION_REPAIR_BUDGET}
+    if COMPLETION_STOP_SEQUENCE:
+        extra["stop"] = [CLOSE_TAG]
+    return extra
+
+
+def is_well_formed(text):
+    return OPEN_TAG in text
+
+
+def assess(text):
+    """Format outcome of one completion: well_formed, truncated (cut off
+    inside <StudentResponse> by the budget) or fallback (never opened it)."""
+    start = text.find(OPEN_TAG)
+    if start == -1:
+        return "fallback"
+    # A provider-side stop sequence drops the closing tag itself, so only a
+    # locally ended stream can tell a finished answer from a cut one
+    if CLOSE_TAG not in text[start:] and not COMPLETION_STOP_SEQUENCE:
+        return "truncated"
+    return "well_formed"
+
+
+def body(text):
+    """Text between the <StudentResponse> tags of a finalized answer."""
+    start = text.find(OPEN_TAG) + len(OPEN_TAG)
+    return text[start:text.find(CLOSE_TAG, start)].strip()
+
+
+def repair_messages(messages, text):
+    # The scratchpad is dropped from the replayed reply to keep the call cheap
+    return [
+        *messages,
+        {"role": "assistant", "content": ANALYSIS_BLOCK.sub("", text).strip()},
+        {"role": "user", "content": REPAIR_INSTRUCTION},
+    ]
+
+
+def finalize(text):
+    """Close a <StudentResponse> block cut short by a stop sequence or the
+    budget, or wrap an answer that never opened one."""
+    start = text.find(OPEN_TAG)
+    if start == -1:
+        return f"{OPEN_TAG}\n{ANALYSIS_BLOCK.sub('', text).strip()}\n{CLOSE_TAG}"
+    if CLOSE_TAG not in text[start:]:
+        return f"{text.rstrip()}\n{CLOSE_TAG}"
+    return text
+
+
+def record(category, generated, seconds, outcome):
+    """Account one upstream answer: `generated` is every completion text
+    produced for it, `outcome` is well_formed, repaired, truncated, fallback
+    or empty."""
+    metrics.COMPLETION_TOKENS.labels(category=category).observe(
+        sum(curriculum.estimate_tokens(text) for text in generated)
+    )
+    metrics.COMPLETION_SECONDS.labels(category=category).observe(seconds)
+    metrics.COMPLETION_OUTCOMES.labels(category=category, outcome=outcome).inc()
+
+
+async def answer(messages, category, complete):
+    """The model's answer to `messages` within the `category` budget and its
+    outcome (see `assess`; "repaired" once a short repair request supplied
+    the missing tags). A failed repair falls back to wrapping the first
+    answer locally; raises EmptyAnswer when that leaves nothing to show.
+
+    `complete(messages, params=...)` returns the text of one upstream call.
+    """
+    started = time.perf_counter()
+    text = await complete(messages, params=params(category))
+    generated = [text]
+    outcome = assess(text)
+    if outcome == "fallback" and COMPLETION_REPAIR_ENABLED:
+        try:
+            repaired = await complete(repair_messages(messages, text), params=repair_params())
+        except Exception as e:
+            # No model, deadline or admission: the first answer is still usable
+            print(f"budgets: repair call failed: {e!r}")
+            repaired = ""
+        generated.append(repaired)
+        if is_well_formed(repaired):
+            text = repaired
+            outcome = "repaired" if assess(repaired) == "well_formed" else "truncated"
+    text = finalize(text)
+    if not body(text):
+        record(category, generated, time.perf_counter() - started, "empty")
+        raise EmptyAnswer(category)
+    record(category, generated, time.perf_counter() - started, outcome)
+    return text, outcome
@@ -0,0 +1,346 @@
+import asyncio
+import hashlib
+import io
+import json
+import os
+import re
+import sqlite3
+import time
+import tokenize
+from collections import OrderedDict, namedtuple
+
+import metrics
+from fingerprint import fingerprint_code, translate_identifiers
+from shared_db import SharedDatabase
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") == "1"
+CACHE_DB_PATH = os.getenv(
+    "CACHE_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "response_cache.sqlite3")
+)
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", str(24 * 3600)))
+CACHE_MEMORY_MAX_ENTRIES = int(os.getenv("CACHE_MEMORY_MAX_ENTRIES", "2048"))
+CACHE_MEMORY_MAX_BYTES = int(os.getenv("CACHE_MEMORY_MAX_BYTES", str(32 * 1024 * 1024)))
+# How often a worker checks for invalidations issued by other workers
+CACHE_SYNC_INTERVAL = float(os.getenv("CACHE_SYNC_INTERVAL", "2"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query):
+    return _WHITESPACE.sub(" ", query).strip().lower()
+
+
+def _strip_comments(code):
+    tokens = []
+    for token in tokenize.generate_tokens(io.StringIO(code).readline):
+        if token.type == tokenize.COMMENT:
+            continue
+        tokens.append(token)
+    return tokenize.untokenize(tokens)
+
+
+def normalize_code(code):
+    """Drop comments, trailing whitespace and blank lines; keep indentation."""
+    code = code.replace("\r\n", "\n").replace("\t", "    ")
+    try:
+        code = _strip_comments(code)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        # Code that does not tokenize still gets line-level cleanup
+        code = "\n".join(re.sub(r"\s*#.*$", "", line) for line in code.split("\n"))
+    lines = (line.rstrip() for line in code.split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def make_key(question_id, query, code):
+    payload = "\x1f".join((question_id, normalize_query(query), normalize_code(code)))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def make_fingerprint_key(question_id, query, digest):
+    payload = "\x1f".join(("fingerprint", question_id, normalize_query(query), digest))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Result of a cache lookup for one submission; `match` is "exact",
+# "fingerprint" or None on a miss
+SubmissionLookup = namedtuple(
+    "SubmissionLookup", ["response", "tier", "match", "exact_key", "fingerprint"]
+)
+
+
+class MemoryLRU:
+    """In-process LRU with per-entry TTL, bounded by entry count and bytes."""
+
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # key -> (question_id, value, expires_at, size)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] < time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, question_id, value, expires_at=None):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (question_id, value, expires_at or time.time() + self.ttl, size)
+        self.total_bytes += size
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate_question(self, question_id):
+        stale = [key for key, entry in self._entries.items() if entry[0] == question_id]
+        for key in stale:
+            self._remove(key)
+        return len(stale)
+
+    def clear(self):
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry[3]
+
+
+class SQLiteStore(SharedDatabase):
+    """Persistent tier shared by every worker on the host."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            question_id TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS responses_question ON responses (question_id);
+        CREATE TABLE IF NOT EXISTS invalidations (
+            question_id TEXT PRIMARY KEY,
+            invalidated_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS fingerprints (
+            question_id TEXT NOT NULL,
+            digest TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            submissions INTEGER NOT NULL,
+            first_seen REAL NOT NULL,
+            PRIMARY KEY (question_id, digest)
+        );
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        # What a response answered, for degraded mode: the normalized query
+        # of exact entries, the program fingerprint of fingerprint entries
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(responses)")}
+        for column in ("query", "digest"):
+            if column not in columns:
+                try:
+                    self._conn.execute(f"ALTER TABLE responses ADD COLUMN {column} TEXT")
+                except sqlite3.OperationalError:
+                    pass  # added by another worker meanwhile
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT question_id, response, expires_at FROM responses WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        return row
+
+    def set(self, key, question_id, value, ttl, query=None, digest=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO responses (key, question_id, response, created_at, expires_at, query, digest)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, question_id, value, now, now + ttl, query, digest),
+            )
+
+    def related_for_question(self, question_id, query, digest):
+        """Newest live fingerprint entry for the same program, else newest
+        exact entry for the same normalized query, as (match, response)."""
+        with self._lock:
+            for match, column, value in (("fingerprint", "digest", digest), ("query", "query", query)):
+                row = self._conn.execute(
+                    f"""
+                    SELECT response FROM responses
+                    WHERE question_id = ? AND {column} = ? AND expires_at > ?
+                    ORDER BY created_at DESC LIMIT 1
+                    """,
+                    (question_id, value, time.time()),
+                ).fetchone()
+                if row is not None:
+                    return match, row[0]
+        return None
+
+    def invalidate_question(self, question_id):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            deleted = self._conn.execute(
+                "DELETE FROM responses WHERE question_id = ?", (question_id,)
+            ).rowcount
+            self._conn.execute(
+                "INSERT OR REPLACE INTO invalidations VALUES (?, ?)", (question_id, time.time())
+            )
+            self._conn.execute("COMMIT")
+        return deleted
+
+    def invalidations_since(self, since):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT question_id, invalidated_at FROM invalidations WHERE invalidated_at > ?",
+                (since,),
+            ).fetchall()
+        return rows
+
+    def record_fingerprint(self, question_id, digest, kind):
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO fingerprints VALUES (?, ?, ?, 1, ?)
+                ON CONFLICT (question_id, digest) DO UPDATE SET submissions = submissions + 1
+                """,
+                (question_id, digest, kind, time.time()),
+            )
+
+    def fingerprint_stats(self, question_id=None):
+        query = """
+            SELECT question_id, COUNT(*), SUM(submissions), SUM(kind = 'tokens')
+            FROM fingerprints {} GROUP BY question_id ORDER BY SUM(submissions) DESC
+        """
+        with self._lock:
+            if question_id is None:
+                return self._conn.execute(query.format("")).fetchall()
+            return self._conn.execute(
+                query.format("WHERE question_id = ?"), (question_id,)
+            ).fetchall()
+
+    def purge_expired(self):
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM responses WHERE expires_at <= ?", (time.time(),)
+            ).rowcount
+
+
+class ResponseCache:
+    """Memory LRU in front of the shared SQLite tier.
+
+    Lookups return (response, tier) where tier is "memory", "disk" or None.
+    """
+
+    def __init__(self, path=CACHE_DB_PATH, ttl=CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self.memory = MemoryLRU(CACHE_MEMORY_MAX_ENTRIES, CACHE_MEMORY_MAX_BYTES, ttl)
+        self.disk = SQLiteStore(path)
+        self._last_sync = time.time()
+
+    def _sync_invalidations(self):
+        # Pick up per-question invalidations made by other workers
+        now = time.time()
+        if now - self._last_sync < CACHE_SYNC_INTERVAL:
+            return
+        rows = self.disk.invalidations_since(self._last_sync - CACHE_SYNC_INTERVAL)
+        self._last_sync = now
+        for question_id, _ in rows:
+            self.memory.invalidate_question(question_id)
+
+    async def get(self, key, kind="exact"):
+        self._sync_invalidations()
+        value = self.memory.get(key)
+        if value is not None:
+            metrics.CACHE_LOOKUPS.labels(kind=kind, tier="memory", result="hit").inc()
+            return value, "memory"
+        # Only the disk tier leaves the event loop
+        row = await asyncio.to_thread(self.disk.get, key)
+        if row is not None:
+            question_id, value, expires_at = row
+            self.memory.set(key, question_id, value, expires_at)
+            metrics.CACHE_LOOKUPS.labels(kind=kind, tier="disk", result="hit").inc()
+            return value, "disk"
+        metrics.CACHE_LOOKUPS.labels(kind=kind, tier="none", result="miss").inc()
+        return None, None
+
+    async def set(self, key, question_id, value, query=None, digest=None):
+        self.memory.set(key, question_id, value)
+        await asyncio.to_thread(self.disk.set, key, question_id, value, self.ttl, query, digest)
+
+    async def invalidate_question(self, question_id):
+        self.memory.invalidate_question(question_id)
+        return await asyncio.to_thread(self.disk.invalidate_question, question_id)
+
+    async def degraded_answer(self, question_id, query, fingerprint):
+        """Cached answer for a submission the model cannot answer right now:
+        one for the same program (asked differently), else one to the same
+        query. Unrelated answers to the question are never served."""
+        related = await asyncio.to_thread(
+            self.disk.related_for_question, question_id, normalize_query(query), fingerprint.digest
+        )
+        if related is None:
+            return None
+        match, value = related
+        if match == "fingerprint":
+            entry = json.loads(value)
+            return translate_identifiers(entry["response"], entry["names"], fingerprint.names)
+        return value
+
+    async def lookup_submission(self, question_id, query, code):
+        """Look a submission up by normalized text, then by code fingerprint.
+
+        Fingerprint hits come from an alpha-equivalent program, so identifiers
+        in the cached response are rewritten to the student's own names.
+        """
+        exact_key = make_key(question_id, query, code)
+        fingerprint = fingerprint_code(code)
+        await asyncio.to_thread(
+            self.disk.record_fingerprint, question_id, fingerprint.digest, fingerprint.kind
+        )
+        value, tier = await self.get(exact_key)
+        if value is not None:
+            return SubmissionLookup(value, tier, "exact", exact_key, fingerprint)
+        fingerprint_key = make_fingerprint_key(question_id, query, fingerprint.digest)
+        value, tier = await self.get(fingerprint_key, kind="fingerprint")
+        if value is not None:
+            entry = json.loads(value)
+            response = translate_identifiers(entry["response"], entry["names"], fingerprint.names)
+            return SubmissionLookup(response, tier, "fingerprint", exact_key, fingerprint)
+        return SubmissionLookup(None, None, None, exact_key, fingerprint)
+
+    async def store_submission(self, question_id, query, lookup, response):
+        await self.set(lookup.exact_key, question_id, response, query=normalize_query(query))
+        entry = json.dumps({"response": response, "names": lookup.fingerprint.names})
+        fingerprint_key = make_fingerprint_key(question_id, query, lookup.fingerprint.digest)
+        await self.set(fingerprint_key, question_id, entry, digest=lookup.fingerprint.digest)
+
+    async def fingerprint_stats(self, question_id=None):
+        rows = await asyncio.to_thread(self.disk.fingerprint_stats, question_id)
+        return [
+            {
+                "questionId": row[0],
+                "distinctPrograms": row[1],
+                "submissions": row[2],
+                "unparsedPrograms": row[3],
+                "duplicationRatio": round(1 - row[1] / row[2], 4) if row[2] else 0.0,
+            }
+            for row in rows
+        ]
+
+    def close(self):
+        self.disk.close()
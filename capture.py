@@ -0,0 +1,198 @@
+import contextvars
+import glob
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+
+import metrics
+
+# Opt-in: every /api/submit and /api/submit/stream request is appended to a
+# gzip-compressed JSON-lines log for replay (bench/replay.py)
+CAPTURE_ENABLED = os.getenv("CAPTURE_ENABLED", "0") == "1"
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "captures"))
+# A file is closed and a new one started past this many compressed bytes
+CAPTURE_MAX_BYTES = int(os.getenv("CAPTURE_MAX_BYTES", str(64 * 2 ** 20)))
+# Oldest files are deleted beyond this many; 0 keeps everything
+CAPTURE_MAX_FILES = int(os.getenv("CAPTURE_MAX_FILES", "50"))
+# Records waiting for the writer thread; more are dropped, never waited for
+CAPTURE_QUEUE_SIZE = int(os.getenv("CAPTURE_QUEUE_SIZE", "10000"))
+# How often buffered records are flushed so the current file can be read
+CAPTURE_FLUSH_INTERVAL = float(os.getenv("CAPTURE_FLUSH_INTERVAL", "5"))
+# Student ids and client IPs are replaced by an HMAC under this key. Set it
+# to keep pseudonyms stable across workers and restarts; the default random
+# key keeps them stable within one worker only
+CAPTURE_REDACTION_KEY = os.getenv("CAPTURE_REDACTION_KEY") or secrets.token_hex(16)
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+
+CAPTURE = contextvars.ContextVar("capture", default=None)
+
+
+def redact_client(client):
+    """Stable pseudonym for a client key ("student:..." or "ip:...")."""
+    digest = hmac.new(CAPTURE_REDACTION_KEY.encode("utf-8"), client.encode("utf-8"), hashlib.sha256)
+    return f"s-{digest.hexdigest()[:16]}"
+
+
+def redact_text(text):
+    return _EMAIL.sub("[email]", text)
+
+
+class CaptureWriter(threading.Thread):
+    """Appends records to rotated capture-<time>-<pid>.jsonl.gz files.
+
+    Records are handed over through a bounded queue, so the request path
+    never waits on compression or the disk.
+    """
+
+    def __init__(self, directory=CAPTURE_DIR, max_bytes=CAPTURE_MAX_BYTES, max_files=CAPTURE_MAX_FILES):
+        super().__init__(name="capture-writer", daemon=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self._queue = queue.Queue(maxsize=CAPTURE_QUEUE_SIZE)
+        self._raw = self._file = None
+        os.makedirs(directory, exist_ok=True)
+
+    def put(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            metrics.CAPTURE_RECORDS.labels(result="dropped").inc()
+
+    def close(self):
+        self._queue.put(None)
+        self.join()
+
+    def _open(self):
+        name = f"capture-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}.jsonl.gz"
+        self._raw = open(os.path.join(self.directory, name), "ab")
+        self._file = gzip.GzipFile(fileobj=self._raw, mode="ab")
+        self._prune()
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._raw.close()
+            self._raw = self._file = None
+
+    def _prune(self):
+        if not self.max_files:
+            return
+        paths = sorted(glob.glob(os.path.join(self.directory, "capture-*.jsonl.gz")))
+        for path in paths[:-self.max_files]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _write(self, record):
+        if self._file is None:
+            self._open()
+        self._file.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        metrics.CAPTURE_RECORDS.labels(result="written").inc()
+        if self._raw.tell() >= self.max_bytes:
+            self._close_file()
+
+    def _flush(self):
+        # A sync flush makes everything so far readable without closing the file
+        if self._file is not None:
+            self._file.flush()
+
+    def run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                record = self._queue.get(timeout=CAPTURE_FLUSH_INTERVAL)
+            except queue.Empty:
+                record = {}  # idle: only flush
+            if record is None:
+                break
+            try:
+                if record:
+                    self._write(record)
+                if time.monotonic() - last_flush >= CAPTURE_FLUSH_INTERVAL:
+                    self._flush()
+                    last_flush = time.monotonic()
+            except (OSError, TypeError, ValueError) as e:
+                print(f"capture: write failed: {e}")
+                metrics.CAPTURE_RECORDS.labels(result="dropped").inc()
+        self._close_file()
+
+
+_writer = None
+
+
+def start():
+    global _writer
+    if CAPTURE_ENABLED and _writer is None:
+        _writer = CaptureWriter()
+        _writer.start()
+
+
+def stop():
+    global _writer
+    if _writer is not None:
+        _writer.close()
+        _writer = None
+
+
+def begin(endpoint, client, query_data):
+    """Start the record of one request; later stages add to it with note().
+    Returns None when capture is off."""
+    if _writer is None:
+        return None
+    record = {
+        "ts": time.time(),
+        "endpoint": endpoint,
+        "student": redact_client(client),
+        "questionId": query_data.questionId,
+        "query": redact_text(query_data.query),
+        "code": query_data.code,
+        "started": time.perf_counter(),
+    }
+    CAPTURE.set(record)
+    return record
+
+
+def note(**fields):
+    record = CAPTURE.get()
+    if record is not None:
+        record.update(fields)
+
+
+def finish(record, status, response=None, headers=None):
+    """Hand the finished record to the writer thread (once)."""
+    if record is None or _writer is None or "status" in record:
+        return
+    headers = headers or {}
+    record["latencySeconds"] = round(time.perf_counter() - record.pop("started"), 4)
+    record["status"] = status
+    record.setdefault("source", None)
+    record["fastPath"] = headers.get("X-Fast-Path")
+    record["cache"] = headers.get("X-Cache-Match") if headers.get("X-Cache") == "HIT" else None
+    record["response"] = response
+    _writer.put(record)
+
+
+def read(paths):
+    """Records of the capture files `paths`, oldest first. A file still
+    being written (or cut short by a crash) is read up to its last flush."""
+    records = []
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    if line.endswith("\n"):
+                        records.append(json.loads(line))
+            except (EOFError, gzip.BadGzipFile):
+                pass
+    records.sort(key=lambda record: record["ts"])
+    return records
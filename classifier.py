@@ -0,0 +1,193 @@
+import csv
+import math
+import os
+import re
+from collections import Counter, namedtuple
+
+from question_parsing import split_solution
+
+CLASSIFIER_ENABLED = os.getenv("CLASSIFIER_ENABLED", "1") == "1"
+# Queries are answered locally only at or above this confidence
+CLASSIFIER_THRESHOLD = float(os.getenv("CLASSIFIER_THRESHOLD", "0.8"))
+# Optional char n-gram naive Bayes model on top of the keyword rules
+CLASSIFIER_MODEL_ENABLED = os.getenv("CLASSIFIER_MODEL_ENABLED", "0") == "1"
+# Extra labelled examples for the model: CSV with `text,label` columns where
+# label is "portal" or "coding"
+CLASSIFIER_TRAINING_PATH = os.getenv("CLASSIFIER_TRAINING_PATH")
+
+# Same text the prompt's <StandardResponseTemplate> makes the model emit
+OUT_OF_SCOPE_RESPONSE = """<StudentResponse>
+Hi,
+
+Could you please be more specific about your query?
+
+Query is out of scope ("OUT_OF_SCOPE").
+</StudentResponse>"""
+
+Classification = namedtuple("Classification", ["category", "confidence", "reason"])
+
+# Rules seeded from the prompt's <user_query_understanding> section:
+# (category, weight, pattern). Strong rules win even when the query also
+# talks about code, as the prompt prioritises portal issues.
+_STRONG_RULES = [
+    ("portal", 0.95, r"\bcertificat\w*"),
+    ("portal", 0.95, r"\b(?:locked|unlock\w*)\b"),
+    ("portal", 0.95, r"\bplay ?ground\b"),
+    ("portal", 0.9, r"\b(?:can'?t|cannot|unable to|not able to) (?:log ?in|sign ?in)\b"),
+    (
+        "portal",
+        0.9,
+        r"\b(?:can'?t|cannot|unable to|not able to) (?:access|open) (?:\w+ ){0,2}?"
+        r"(?:sessions?|portal|account|course|modules?|videos?|playground|platform|website|app|exams?)\b",
+    ),
+    ("portal", 0.9, r"\brewards?\b"),
+    ("administrative", 0.95, r"\bc\.?g\.?p\.?a\b"),
+    ("administrative", 0.9, r"\brefunds?\b"),
+]
+# Weak rules only count when the query shows no sign of being about code or
+# of the question's statement (marks, passwords, exams, apps and challenges
+# are common exercise topics)
+_WEAK_RULES = [
+    ("portal", 0.85, r"\bexams?\b|\bexamination\b"),
+    ("portal", 0.85, r"\b(?:can'?t|cannot|unable to|not able to) (?:access|open)\b"),
+    ("portal", 0.85, r"\baccount\b"),
+    ("portal", 0.85, r"\b(?:password|log ?in|sign ?in|otp)\b"),
+    ("portal", 0.85, r"\bschedul\w*"),
+    ("portal", 0.85, r"\binstall\w*"),
+    ("portal", 0.85, r"\bchallenges?\b"),
+    ("portal", 0.85, r"\bsessions?\b"),
+    ("portal", 0.85, r"\btechnical (?:issue|problem)s?\b"),
+    ("portal", 0.85, r"\b(?:video|page|website|portal|platform|app)\b"),
+    ("administrative", 0.85, r"\b(?:policy|policies|deadline|extension|fees?)\b"),
+    ("administrative", 0.85, r"\b(?:grades?|marks|score ?card)\b"),
+    ("administrative", 0.85, r"\b(?:feedback|suggestions?|complain\w*)\b"),
+]
+_CODING_SIGNAL = re.compile(
+    r"```|`|\b(?:code|error|output|input|print|loop|for|while|if|else|elif|def|function|"
+    r"variable|list|string|dict\w*|tuple|set|index|return|syntax|indent\w*|test ?cases?|"
+    r"range|split|int|str|append|logic|wrong answer|expected|check\w*|valid\w*|calculat\w*|"
+    r"count\w*|program\w*|numbers?|characters?|words?|sum|average|sort\w*|order|ascending|descending|"
+    r"highest|lowest|largest|smallest|maximum|minimum)\b|[=()\[\]:]"
+)
+_STRONG = [(category, weight, re.compile(pattern, re.I)) for category, weight, pattern in _STRONG_RULES]
+_WEAK = [(category, weight, re.compile(pattern, re.I)) for category, weight, pattern in _WEAK_RULES]
+
+# Seed corpus for the optional model
+_SEED_EXAMPLES = [
+    ("portal", "my session is locked how do i unlock it"),
+    ("portal", "i am not able to access the next session"),
+    ("portal", "when will i get my certificate"),
+    ("portal", "the code playground is not loading"),
+    ("portal", "i completed the challenge but did not get rewards"),
+    ("portal", "when is the exam scheduled"),
+    ("portal", "how do i install python on my laptop"),
+    ("portal", "my account got logged out and i cant login"),
+    ("portal", "the video is not playing in the portal"),
+    ("portal", "how is the cgpa calculated"),
+    ("portal", "i want to give feedback about the platform"),
+    ("portal", "can i get an extension for the deadline"),
+    ("coding", "why is my code giving wrong output"),
+    ("coding", "i am getting an indentation error on line 3"),
+    ("coding", "how do i start this question"),
+    ("coding", "my loop is not stopping"),
+    ("coding", "how to remove words with length k"),
+    ("coding", "what is wrong in my for loop"),
+    ("coding", "test case 2 is failing"),
+    ("coding", "how do i take two inputs and convert to integer"),
+    ("coding", "please explain how to reverse the string"),
+    ("coding", "i am getting name error"),
+    ("coding", "how to print the pattern with spaces"),
+    ("coding", "my function returns none"),
+]
+
+
+def _ngrams(text, sizes=(2, 3, 4)):
+    text = f" {re.sub(r'[^a-z0-9 ]+', ' ', text.lower())} "
+    text = re.sub(r" +", " ", text)
+    for size in sizes:
+        for start in range(len(text) - size + 1):
+            yield text[start:start + size]
+
+
+class NaiveBayes:
+    """Multinomial naive Bayes over character n-grams with Laplace smoothing."""
+
+    def __init__(self, examples):
+        self.counts = {}
+        self.totals = Counter()
+        self.docs = Counter()
+        self.vocabulary = set()
+        for label, text in examples:
+            grams = Counter(_ngrams(text))
+            self.counts.setdefault(label, Counter()).update(grams)
+            self.totals[label] += sum(grams.values())
+            self.docs[label] += 1
+            self.vocabulary.update(grams)
+
+    def predict_proba(self, text, label):
+        grams = Counter(gram for gram in _ngrams(text) if gram in self.vocabulary)
+        n_docs = sum(self.docs.values())
+        vocabulary_size = len(self.vocabulary)
+        scores = {}
+        for candidate, counts in self.counts.items():
+            score = math.log(self.docs[candidate] / n_docs)
+            denominator = self.totals[candidate] + vocabulary_size
+            for gram, count in grams.items():
+                score += count * math.log((counts[gram] + 1) / denominator)
+            scores[candidate] = score
+        top = max(scores.values())
+        exp_scores = {candidate: math.exp(score - top) for candidate, score in scores.items()}
+        return exp_scores.get(label, 0.0) / sum(exp_scores.values())
+
+
+def _load_training_examples(path):
+    with open(path, mode="r", encoding="utf-8") as file:
+        return [(row["label"], row["text"]) for row in csv.DictReader(file)]
+
+
+def _build_model():
+    if not CLASSIFIER_MODEL_ENABLED:
+        return None
+    examples = list(_SEED_EXAMPLES)
+    if CLASSIFIER_TRAINING_PATH:
+        examples += _load_training_examples(CLASSIFIER_TRAINING_PATH)
+    return NaiveBayes(examples)
+
+
+_model = _build_model()
+
+
+def classify(query, question_details=None):
+    """Decide whether a query is out of scope before any upstream call.
+
+    Returns a Classification whose category is "portal", "administrative" or
+    "coding"; confidence is the probability of the non-coding category.
+    Weak keywords are ignored once one of them also appears in the statement
+    of `question_details`: the query is then about the exercise.
+    """
+    statement = split_solution(question_details)[0] if question_details else ""
+    best = Classification("coding", 0.0, None)
+    for category, weight, pattern in _STRONG:
+        if weight > best.confidence and pattern.search(query):
+            best = Classification(category, weight, pattern.pattern)
+    if best.confidence < CLASSIFIER_THRESHOLD and not _CODING_SIGNAL.search(query):
+        weak = [rule for rule in _WEAK if rule[2].search(query)]
+        # One keyword shared with the statement puts the query on the exercise
+        if not any(pattern.search(statement) for _, _, pattern in weak):
+            for category, weight, pattern in weak:
+                if weight > best.confidence:
+                    best = Classification(category, weight, pattern.pattern)
+    if _model is not None and best.confidence < CLASSIFIER_THRESHOLD:
+        probability = _model.predict_proba(query, "portal")
+        if probability > best.confidence:
+            best = Classification("portal", probability, "model")
+    if best.confidence < CLASSIFIER_THRESHOLD:
+        return Classification("coding", best.confidence, best.reason)
+    return best
+
+
+def is_out_of_scope(query, question_details=None):
+    if not CLASSIFIER_ENABLED:
+        return None
+    result = classify(query, question_details)
+    return result if result.category != "coding" else None
@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import json
+import os
+
+import admission
+import curriculum
+import deadlines
+import metrics
+import router
+import streaming
+
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "1") == "1"
+# Starting estimate of a completion's length, refined as calls complete; a
+# cancelled call is credited with the part of it not yet generated
+UPSTREAM_EXPECTED_TOKENS = float(os.getenv("UPSTREAM_EXPECTED_TOKENS", "1000"))
+
+_expected_tokens = UPSTREAM_EXPECTED_TOKENS
+
+
+def _record_completion(chunks):
+    global _expected_tokens
+    _expected_tokens = 0.9 * _expected_tokens + 0.1 * curriculum.estimate_tokens("".join(chunks))
+
+
+def _record_cancellation(reason, chunks):
+    generated = curriculum.estimate_tokens("".join(chunks))
+    metrics.UPSTREAM_CANCELLATIONS.labels(reason=reason).inc()
+    metrics.UPSTREAM_TOKENS_SAVED.labels(reason=reason).inc(max(0.0, _expected_tokens - generated))
+
+
+def _cancel_reason():
+    # Why the current request stopped reading before the answer was complete
+    return "deadline" if deadlines.expired() else "disconnect"
+
+
+def prompt_key(messages, model=None, params=None):
+    payload = json.dumps(
+        [model or router.UPSTREAM_MODELS, messages, params or {}], sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Flight:
+    """One upstream call shared by every request with the same prompt.
+
+    Deltas are kept so that requests joining late replay what the others
+    have already seen before following the live stream.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.waiters = 0
+        self.task = None
+        self.deadline = None
+        self.cancel_reason = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def publish(self, chunk):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error=None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def deltas(self):
+        index = 0
+        while True:
+            changed = self._changed
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class Coalescer:
+    def __init__(self):
+        self._flights = {}
+
+    def _join(self, key, produce, mode):
+        deadline = deadlines.DEADLINE.get()
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = Flight()
+            # The call runs until the latest deadline of the requests waiting on it
+            flight.deadline = deadlines.Deadline(deadline.at) if deadline is not None else None
+            flight.task = asyncio.create_task(self._run(key, flight, produce))
+            self._flights[key] = flight
+            metrics.UPSTREAM_CALLS.labels(mode=mode, role="originated").inc()
+        else:
+            if flight.deadline is not None:
+                flight.deadline.extend(deadline)
+            metrics.UPSTREAM_CALLS.labels(mode=mode, role="coalesced").inc()
+        return flight
+
+    async def _run(self, key, flight, produce):
+        # Runs as its own task, so cancelling the request that started the
+        # call does not cancel it for the requests that joined later
+        deadlines.DEADLINE.set(flight.deadline)
+        try:
+            async for chunk in produce():
+                flight.publish(chunk)
+        except asyncio.CancelledError:
+            _record_cancellation(flight.cancel_reason or "shutdown", flight.chunks)
+            flight.finish(RuntimeError("Upstream call was cancelled."))
+            raise
+        except Exception as e:
+            flight.finish(e)
+        else:
+            _record_completion(flight.chunks)
+            flight.finish()
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def stream(self, key, produce, mode="stream"):
+        flight = self._join(key, produce, mode)
+        flight.waiters += 1
+        reason = "closed"
+        try:
+            async for chunk in flight.deltas():
+                yield chunk
+        except asyncio.CancelledError:
+            reason = _cancel_reason()
+            raise
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.done:
+                # Nobody is left to read the answer: stop paying for it and
+                # let the next identical request start afresh
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.cancel_reason = reason
+                flight.task.cancel()
+
+    def __len__(self):
+        return len(self._flights)
+
+
+_coalescer = Coalescer()
+
+
+async def _admitted_stream(messages, priority, params):
+    async with admission.upstream_slot(priority):
+        # The answer is complete at </StudentResponse>: stop reading there
+        deltas = streaming.until_closed(router.stream(messages, **params), metrics.EARLY_STOPS.inc)
+        async for delta in deltas:
+            yield delta
+
+
+async def _uncoalesced_stream(messages, priority, params):
+    chunks = []
+    try:
+        async for delta in _admitted_stream(messages, priority, params):
+            chunks.append(delta)
+            yield delta
+    except asyncio.CancelledError:
+        _record_cancellation(_cancel_reason(), chunks)
+        raise
+    except GeneratorExit:
+        _record_cancellation("closed", chunks)
+        raise
+    _record_completion(chunks)
+
+
+def stream(messages, priority=admission.FIRST_ATTEMPT, mode="stream", params=None):
+    """Async iterator of content deltas for `messages`; identical prompts in
+    flight receive the same deltas. `params` are extra upstream arguments
+    such as max_tokens."""
+    params = params or {}
+    if not COALESCE_ENABLED:
+        return _uncoalesced_stream(messages, priority, params)
+    return _coalescer.stream(
+        prompt_key(messages, params=params), lambda: _admitted_stream(messages, priority, params), mode
+    )
+
+
+async def complete(messages, priority=admission.FIRST_ATTEMPT, params=None):
+    """Text of the upstream completion for `messages`, sharing the call with
+    identical prompts already in flight."""
+    return "".join([delta async for delta in stream(messages, priority, mode="complete", params=params)])
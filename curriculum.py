@@ -0,0 +1,650 @@
+import ast
+import math
+import re
+from functools import lru_cache
+
+from question_parsing import split_solution
+
+# The session curriculum, in teaching order. Each question's prompt only
+# carries the modules its reference solution actually uses.
+CONCEPT_MODULES = [
+    (
+        "Introduction to Python",
+        """\
+- Variable and Value
+- Data Types
+  - String
+  - Integer
+  - Float
+  - Boolean
+- Expression
+  - BODMAS
+""",
+    ),
+    (
+        "I/O Basics",
+        """\
+- String Concatenation
+- String Repetition
+- Length of String
+- Take Input From User
+- String Slicing
+  - Slicing to End
+  - Slicing from Start
+- Checking Data Type
+- Type Conversion
+  - String to Integer
+  - Integer to Float
+  - Float to String
+  - …and so on
+""",
+    ),
+    (
+        "Operators & Conditional Statements",
+        """\
+- Relational Operators
+  - Comparing Numbers
+  - Comparing Strings
+  - Strings and Equality Operator
+- Logical Operators
+  - Logical AND Operator
+  - Logical OR Operator
+  - Logical NOT Operator
+- Block of Code
+- Conditional Statements
+  - Conditional Block
+  - Indentation
+  - If - Else Syntax
+""",
+    ),
+    (
+        "Nested Conditions",
+        """\
+- More Arithmetic Operators
+  - Modulus
+  - Exponent
+  - Square of a number
+  - Square root of a number
+- Nested Conditional Statements
+  - Nested Conditions
+  - Nested Condition in Else Block
+  - Elif Statement
+  - Multiple Elif Statements
+  - Execution of Elif Statement
+  - Optional Else Statement
+""",
+    ),
+    (
+        "Loops",
+        """\
+- Loops
+- While Loop
+- For Loop
+- Range
+  - Range with Start and End
+- Approach for Hollow pattern problem
+- Extended Slicing
+- String Methods
+  - `isdigit()`
+  - `strip()`
+  - `lower()`
+  - `upper()`
+  - `startswith()`
+  - `endswith()`
+  - `replace()`
+""",
+    ),
+    (
+        "Additional Reading Material in Loops (1)",
+        """\
+**Classification Methods**
+- `isalpha()`
+- `isdecimal()`
+- `islower()`
+- `isupper()`
+- `isalnum()`
+""",
+    ),
+    (
+        "Additional Reading Material in Loops (2)",
+        """\
+**Case Conversion Methods**
+- `capitalize()`
+- `title()`
+- `swapcase()`
+""",
+    ),
+    (
+        "Additional Reading Material in Loops (3)",
+        """\
+**Counting and Searching Methods**
+- `count()`
+- `index()`
+- `rindex()`
+- `find()`
+- `rfind()`
+""",
+    ),
+    (
+        "Loop Control Statements",
+        """\
+- Nested Loops
+  - Nested Repeating Block
+- Loop Control Statements
+  - `break`
+  - `continue`
+  - `pass`
+  - `if-elif-else`
+  - Empty Loops
+""",
+    ),
+    (
+        "Comparing Strings & Naming Variables",
+        """\
+- Comparing Strings
+  - Unicode
+  - `ord()`
+  - `chr()`
+  - Unicode Ranges
+  - Printing Characters
+  - Character by Character Comparison
+- Naming Variables
+  - Rules #1–4
+  - Case Styles
+  - Keywords
+- Rounding Numbers
+  - `round(number, digits?)`
+  - Floating Point Approximation
+- Comments
+- Floor Division Operator
+- Compound Assignment Operators
+- Escape Characters
+- Single And Double Quotes
+  - Passing Strings With Quotes
+""",
+    ),
+    (
+        "Lists",
+        """\
+- Data Structures
+- List
+  - Creating a List
+  - Creating a List of Lists
+  - Length of a List
+  - Accessing List Items
+  - Iterating Over a List
+  - List Concatenation
+  - Adding Items to List
+  - List Slicing
+  - Extended Slicing
+  - Converting to List
+  - Lists are Mutable
+  - Strings are Immutable
+  - Working with Lists
+- Object & Identity
+  - Finding Id
+  - Id of Lists
+- Modifying Lists
+""",
+    ),
+    (
+        "Functions",
+        """\
+- Lists and Strings
+  - Splitting (`str_var.split(separator)`)
+    - Multiple Whitespaces
+    - Using Separator
+    - Space as Separator
+    - String as Separator
+  - Joining (`str.join(sequence)`)
+    - Joining Non-String Values
+- Negative Indexing
+  - Reversing a List
+  - Accessing List Items
+  - Slicing With Negative Index
+  - Out of Bounds Index
+  - Negative Step Size
+  - Reversing a String
+- Reusing Code
+  - Defining a Function
+  - Calling a Function
+  - Function With Arguments
+  - Variables Inside a Function
+  - Returning a Value
+- Built-in Functions
+  - `print()`
+  - `int()`
+  - `str()`
+  - `len()`
+- Function Arguments
+  - Keyword Arguments
+  - Positional Arguments
+  - Passing Immutable Objects
+""",
+    ),
+    (
+        "Recursion",
+        """\
+- Passing Mutable Objects
+- Built-in Functions
+  - Finding Minimum: `min()`
+    - Minimum of Strings
+  - Finding Maximum: `max()`
+  - Finding Sum: `sum(sequence)`
+  - Ordering List Items: `sorted(sequence)`
+    - Reverse Ordering: `sorted(sequence, reverse=True)`
+- Stack
+- Calling a Function
+- Sum of Squares of List Items
+- Function Call Stack
+- Recursion
+  - Multiply N Numbers
+  - Base Case
+  - Without Base Case
+- List Methods
+  - `append()`
+  - `extend()`
+  - `insert()`
+  - `pop()`
+  - `clear()`
+  - `remove()`
+  - `sort()`
+  - `index()`
+""",
+    ),
+    (
+        "Tuples & Sets",
+        """\
+- Tuples and Sequences
+- `None`
+- Function Without Return / Returns Nothing
+- Tuple
+  - Creating a Tuple
+  - Tuple with a Single Item
+  - Accessing Tuple Elements
+  - Operations on Tuples
+    - `len()`
+    - Iterating
+    - Slicing
+    - Extended Slicing
+  - String to Tuple
+  - List to Tuple
+  - Sequence to Tuple
+  - Membership Check
+    - `in`
+    - `not in`
+  - List Membership
+  - String Membership
+  - Packing & Unpacking
+- Sets
+  - Creating a Set
+    - No Duplicate Items
+    - Immutable Items
+    - Creating Empty Set
+  - Converting to Set
+    - String to Set
+    - Tuple to Set
+  - Accessing Items (Indexing, Slicing)
+  - Adding Items
+    - `set.add(value)`
+    - `set.update(sequence)`
+  - Removing Specific Item
+    - `set.discard(value)`
+  - Operations on Sets
+    - `clear()`
+    - `len()`
+    - Iterating
+    - Membership Check
+  - Set Operations
+    - Union
+    - Intersection
+    - Difference
+    - Symmetric Difference
+  - Set Comparisons
+    - `issubset()`
+    - `issuperset()`
+    - `isdisjoint()`
+""",
+    ),
+    (
+        "Dictionaries",
+        """\
+- Nested Lists & String Formatting
+  - Accessing Nested List
+  - Accessing Items of Nested List
+  - String Formatting
+    - Add Placeholders
+    - Number of Placeholders
+    - Numbering Placeholders
+    - Naming Placeholder
+- Dictionaries
+  - Creating a Dictionary
+  - Collection of Key-Value Pairs
+  - Immutable Keys
+  - Creating Empty Dictionary
+  - Accessing Items – `get()`
+  - `KeyError`
+  - Membership Check
+  - Operations on Dictionaries
+    - Adding a key-value pair
+    - Modifying existing items
+    - Deleting existing items
+  - Dictionary Views
+    - `dict.keys()`
+    - `dict.values()`
+    - `dict.items()`
+  - Getting Keys
+  - Getting Values
+  - Getting Items
+  - Iterate over Dictionary Views
+  - Dictionary View Objects
+  - Converting to Dictionary
+  - Type of Keys
+  - `copy()`
+  - `get()`
+  - `update()`
+  - `fromkeys()`
+  - Referring Same Dictionary Object
+  - Copy of Dictionary
+  - Copy of List
+  - More Operations on Dictionaries
+    - `len()`
+    - `clear()`
+    - Membership Check
+    - Iterating
+- Arbitrary Function Arguments
+  - Passing Multiple Values
+  - Variable Length Arguments
+  - Unpacking as Arguments
+  - Multiple Keyword Arguments
+  - Unpacking as Arguments
+- Built-in Functions
+  - `abs()`
+  - `all()`
+  - `any()`
+  - `reversed()`
+  - `enumerate()`
+- List Methods
+  - `copy()`
+  - `reverse()`
+""",
+    ),
+]
+
+
+# Not a session of the curriculum above, but the catalogue has OOP questions
+# (e.g. the `Item` class) whose solutions need it
+CLASSES_MODULE = (
+    "Classes and Objects",
+    """\
+- Classes
+  - Defining a Class
+  - Creating an Object
+  - `__init__()` Method
+  - Attributes
+  - Methods
+  - `self`
+- Errors and Exceptions
+  - Raising an Exception (`raise`)
+  - Handling Exceptions (`try`, `except`)
+""",
+)
+
+ALL_MODULES = CONCEPT_MODULES + [CLASSES_MODULE]
+_MODULE_TEXT = dict(ALL_MODULES)
+_ORDER = [title for title, _ in ALL_MODULES]
+
+INTRO = "Introduction to Python"
+IO_BASICS = "I/O Basics"
+CONDITIONALS = "Operators & Conditional Statements"
+NESTED_CONDITIONS = "Nested Conditions"
+LOOPS = "Loops"
+CLASSIFICATION_METHODS = "Additional Reading Material in Loops (1)"
+CASE_METHODS = "Additional Reading Material in Loops (2)"
+SEARCH_METHODS = "Additional Reading Material in Loops (3)"
+LOOP_CONTROL = "Loop Control Statements"
+STRINGS_AND_NAMES = "Comparing Strings & Naming Variables"
+LISTS = "Lists"
+FUNCTIONS = "Functions"
+RECURSION = "Recursion"
+TUPLES_AND_SETS = "Tuples & Sets"
+DICTIONARIES = "Dictionaries"
+CLASSES = "Classes and Objects"
+
+# Every question's prompt starts from these
+BASE_MODULES = (INTRO, IO_BASICS)
+PREREQUISITES = {
+    NESTED_CONDITIONS: (CONDITIONALS,),
+    LOOP_CONTROL: (LOOPS,),
+    CLASSIFICATION_METHODS: (LOOPS,),
+    CASE_METHODS: (LOOPS,),
+    SEARCH_METHODS: (LOOPS,),
+    RECURSION: (FUNCTIONS,),
+    CLASSES: (FUNCTIONS,),
+}
+
+# Function and method names mapped to the module that teaches them
+_CALLS = {
+    "range": (LOOPS,),
+    "isdigit": (LOOPS,), "strip": (LOOPS,), "lower": (LOOPS,), "upper": (LOOPS,),
+    "startswith": (LOOPS,), "endswith": (LOOPS,), "replace": (LOOPS,),
+    "isalpha": (CLASSIFICATION_METHODS,), "isdecimal": (CLASSIFICATION_METHODS,),
+    "islower": (CLASSIFICATION_METHODS,), "isupper": (CLASSIFICATION_METHODS,),
+    "isalnum": (CLASSIFICATION_METHODS,),
+    "capitalize": (CASE_METHODS,), "title": (CASE_METHODS,), "swapcase": (CASE_METHODS,),
+    "count": (SEARCH_METHODS,), "index": (SEARCH_METHODS, RECURSION), "rindex": (SEARCH_METHODS,),
+    "find": (SEARCH_METHODS,), "rfind": (SEARCH_METHODS,),
+    "ord": (STRINGS_AND_NAMES,), "chr": (STRINGS_AND_NAMES,), "round": (STRINGS_AND_NAMES,),
+    "list": (LISTS,), "id": (LISTS,),
+    "split": (FUNCTIONS,), "join": (FUNCTIONS,),
+    "min": (RECURSION,), "max": (RECURSION,), "sum": (RECURSION,), "sorted": (RECURSION,),
+    "append": (RECURSION,), "extend": (RECURSION,), "insert": (RECURSION,), "pop": (RECURSION,),
+    "clear": (RECURSION,), "remove": (RECURSION,), "sort": (RECURSION,),
+    "tuple": (TUPLES_AND_SETS,), "set": (TUPLES_AND_SETS,), "add": (TUPLES_AND_SETS,),
+    "discard": (TUPLES_AND_SETS,), "union": (TUPLES_AND_SETS,), "intersection": (TUPLES_AND_SETS,),
+    "difference": (TUPLES_AND_SETS,), "symmetric_difference": (TUPLES_AND_SETS,),
+    "issubset": (TUPLES_AND_SETS,), "issuperset": (TUPLES_AND_SETS,), "isdisjoint": (TUPLES_AND_SETS,),
+    "update": (TUPLES_AND_SETS, DICTIONARIES),
+    "dict": (DICTIONARIES,), "get": (DICTIONARIES,), "keys": (DICTIONARIES,),
+    "values": (DICTIONARIES,), "items": (DICTIONARIES,), "copy": (DICTIONARIES,),
+    "fromkeys": (DICTIONARIES,), "format": (DICTIONARIES,), "abs": (DICTIONARIES,),
+    "all": (DICTIONARIES,), "any": (DICTIONARIES,), "reversed": (DICTIONARIES,),
+    "enumerate": (DICTIONARIES,), "reverse": (DICTIONARIES,),
+}
+
+
+class _ConceptDetector(ast.NodeVisitor):
+    def __init__(self):
+        self.modules = set(BASE_MODULES)
+        self._loop_depth = 0
+        self._functions = []
+
+    def visit_If(self, node):
+        self.modules.add(CONDITIONALS)
+        if any(isinstance(child, ast.If) for child in node.body + node.orelse):
+            self.modules.add(NESTED_CONDITIONS)
+        self.generic_visit(node)
+
+    def visit_IfExp(self, node):
+        self.modules.add(CONDITIONALS)
+        self.generic_visit(node)
+
+    def visit_Compare(self, node):
+        self.modules.add(CONDITIONALS)
+        if any(isinstance(op, (ast.In, ast.NotIn)) for op in node.ops):
+            self.modules.add(TUPLES_AND_SETS)
+        if any(isinstance(op, (ast.Is, ast.IsNot)) for op in node.ops):
+            self.modules.add(TUPLES_AND_SETS)
+        self.generic_visit(node)
+
+    def visit_BoolOp(self, node):
+        self.modules.add(CONDITIONALS)
+        self.generic_visit(node)
+
+    def visit_BinOp(self, node):
+        if isinstance(node.op, (ast.Mod, ast.Pow)):
+            self.modules.add(NESTED_CONDITIONS)
+        elif isinstance(node.op, ast.FloorDiv):
+            self.modules.add(STRINGS_AND_NAMES)
+        self.generic_visit(node)
+
+    def visit_AugAssign(self, node):
+        self.modules.add(STRINGS_AND_NAMES)
+        self.generic_visit(node)
+
+    def _visit_loop(self, node):
+        self.modules.add(LOOPS)
+        if self._loop_depth:
+            self.modules.add(LOOP_CONTROL)
+        self._loop_depth += 1
+        self.generic_visit(node)
+        self._loop_depth -= 1
+
+    visit_For = visit_While = _visit_loop
+
+    def visit_Break(self, node):
+        self.modules.add(LOOP_CONTROL)
+
+    visit_Continue = visit_Pass = visit_Break
+
+    def visit_List(self, node):
+        self.modules.add(LISTS)
+        self.generic_visit(node)
+
+    def visit_Subscript(self, node):
+        index = node.slice
+        if isinstance(index, ast.UnaryOp) and isinstance(index.op, ast.USub):
+            self.modules.add(FUNCTIONS)
+        if isinstance(index, ast.Slice) and index.step is not None:
+            self.modules.add(LOOPS)
+        if isinstance(node.value, ast.Subscript):
+            self.modules.add(DICTIONARIES)
+        self.generic_visit(node)
+
+    def visit_Tuple(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self.modules.add(TUPLES_AND_SETS)
+        self.generic_visit(node)
+
+    def visit_Set(self, node):
+        self.modules.add(TUPLES_AND_SETS)
+        self.generic_visit(node)
+
+    def visit_Constant(self, node):
+        if node.value is None:
+            self.modules.add(TUPLES_AND_SETS)
+
+    def visit_Dict(self, node):
+        self.modules.add(DICTIONARIES)
+        self.generic_visit(node)
+
+    visit_DictComp = visit_Dict
+
+    def visit_JoinedStr(self, node):
+        self.modules.add(DICTIONARIES)
+        self.generic_visit(node)
+
+    def visit_FunctionDef(self, node):
+        self.modules.add(FUNCTIONS)
+        if node.args.vararg or node.args.kwarg:
+            self.modules.add(DICTIONARIES)
+        self._functions.append(node.name)
+        self.generic_visit(node)
+        self._functions.pop()
+
+    def visit_Call(self, node):
+        name = node.func.attr if isinstance(node.func, ast.Attribute) else getattr(node.func, "id", None)
+        if name in self._functions:
+            self.modules.add(RECURSION)
+        self.modules.update(_CALLS.get(name, ()))
+        if any(isinstance(arg, ast.Starred) for arg in node.args) or any(
+            keyword.arg is None for keyword in node.keywords
+        ):
+            self.modules.add(DICTIONARIES)
+        self.generic_visit(node)
+
+    def visit_ClassDef(self, node):
+        self.modules.add(CLASSES)
+        self.generic_visit(node)
+
+    def visit_Raise(self, node):
+        self.modules.add(CLASSES)
+        self.generic_visit(node)
+
+    visit_Try = visit_Raise
+
+
+_KEYWORD_HINTS = [
+    (re.compile(r"\bclass\s+\w+"), CLASSES),
+    (re.compile(r"\bdef\s+\w+"), FUNCTIONS),
+    (re.compile(r"\b(?:for|while)\b"), LOOPS),
+    (re.compile(r"\bif\b"), CONDITIONALS),
+    (re.compile(r"\belif\b"), NESTED_CONDITIONS),
+    (re.compile(r"\[[^\]]*\]"), LISTS),
+    (re.compile(r"\{[^}]*:[^}]*\}"), DICTIONARIES),
+]
+
+
+def required_modules(solution):
+    """Curriculum modules a reference solution relies on, in teaching order.
+
+    Returns None when nothing can be inferred, in which case callers fall
+    back to the full curriculum.
+    """
+    if not solution.strip():
+        return None
+    try:
+        detector = _ConceptDetector()
+        detector.visit(ast.parse(solution))
+        modules = detector.modules
+    except SyntaxError:
+        # Many catalogue solutions lost their indentation; scan keywords instead
+        modules = set(BASE_MODULES)
+        for word, _ in _CALLS.items():
+            if re.search(rf"\b{word}\(", solution):
+                modules.update(_CALLS[word])
+        for pattern, module in _KEYWORD_HINTS:
+            if pattern.search(solution):
+                modules.add(module)
+    pending = list(modules)
+    while pending:
+        for prerequisite in PREREQUISITES.get(pending.pop(), ()):
+            if prerequisite not in modules:
+                modules.add(prerequisite)
+                pending.append(prerequisite)
+    return [title for title in _ORDER if title in modules]
+
+
+def render_modules(titles):
+    return "\n".join(f"## {title}\n{_MODULE_TEXT[title]}" for title in titles)
+
+
+FULL_CONCEPTS = render_modules(title for title, _ in CONCEPT_MODULES)
+
+
+def modules_for(question_details):
+    _, solution = split_solution(question_details)
+    return required_modules(solution)
+
+
+@lru_cache(maxsize=4096)
+def concepts_for(question_details):
+    """The <concepts_covered> body for one question."""
+    modules = modules_for(question_details)
+    if modules is None:
+        return FULL_CONCEPTS
+    return render_modules(modules)
+
+
+try:
+    import tiktoken
+
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # optional dependency; fall back to a character estimate
+    _ENCODING = None
+
+
+def estimate_tokens(text):
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return math.ceil(len(text) / 4)
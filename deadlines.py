@@ -0,0 +1,116 @@
+import asyncio
+import contextvars
+import time
+
+import metrics
+
+# Clients send either an absolute deadline (Unix seconds) or a time budget
+DEADLINE_HEADER = "X-Request-Deadline"
+TIMEOUT_HEADER = "X-Request-Timeout"
+
+
+class Deadline:
+    """Point in time (monotonic clock) by which an answer is useless.
+
+    Mutable so a coalesced upstream call can be extended to the latest
+    deadline among the requests waiting on it; `at` is None for no limit.
+    """
+
+    def __init__(self, at):
+        self.at = at
+
+    def remaining(self):
+        return None if self.at is None else self.at - time.monotonic()
+
+    def extend(self, other):
+        if self.at is None:
+            return
+        if other is None or other.at is None:
+            self.at = None
+        else:
+            self.at = max(self.at, other.at)
+
+
+DEADLINE = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage):
+        super().__init__(f"Request deadline exceeded ({stage}).")
+        self.stage = stage
+
+
+def from_epoch(value):
+    return Deadline(time.monotonic() + float(value) - time.time())
+
+
+def from_headers(deadline=None, timeout=None):
+    """Deadline from the request headers, or None when neither is sent or
+    they do not parse. The earlier of the two wins."""
+    deadlines = []
+    try:
+        if deadline is not None:
+            deadlines.append(from_epoch(deadline).at)
+        if timeout is not None:
+            deadlines.append(time.monotonic() + float(timeout))
+    except ValueError:
+        return None
+    return Deadline(min(deadlines)) if deadlines else None
+
+
+def remaining():
+    """Seconds left for the current request, or None without a deadline."""
+    deadline = DEADLINE.get()
+    return None if deadline is None else deadline.remaining()
+
+
+def expired():
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def exceeded(stage):
+    metrics.DEADLINE_EXCEEDED.labels(stage=stage).inc()
+    return DeadlineExceeded(stage)
+
+
+def check(stage):
+    """Raise DeadlineExceeded instead of starting work that cannot finish in time."""
+    if expired():
+        raise exceeded(stage)
+
+
+def timeout(default):
+    """`default` seconds, capped at the time left for the current request."""
+    left = remaining()
+    return default if left is None else max(0.001, min(default, left))
+
+
+def epoch():
+    """The current deadline as Unix seconds, for forwarding, or None."""
+    left = remaining()
+    return None if left is None else time.time() + left
+
+
+async def bounded(deltas, stage="upstream"):
+    """Pass deltas through, raising DeadlineExceeded once the deadline passes.
+
+    The pending read is cancelled, so an upstream call nobody else waits
+    for is cancelled with it.
+    """
+    if DEADLINE.get() is None:
+        async for delta in deltas:
+            yield delta
+        return
+    iterator = deltas.__aiter__()
+    try:
+        while True:
+            try:
+                delta = await asyncio.wait_for(iterator.__anext__(), timeout(float("inf")))
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                raise exceeded(stage)
+            yield delta
+    finally:
+        await iterator.aclose()
@@ -0,0 +1,171 @@
+import asyncio
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+
+# "annotate" attaches compiler errors to the prompt, "answer" replies with a
+# templated explanation without calling the model, "off" skips the stage
+DIAGNOSTICS_MODE = os.getenv("DIAGNOSTICS_MODE", "annotate")
+DIAGNOSTICS_WORKERS = int(os.getenv("DIAGNOSTICS_WORKERS", "2"))
+DIAGNOSTICS_TIMEOUT = float(os.getenv("DIAGNOSTICS_TIMEOUT", "1.0"))
+DIAGNOSTICS_MAX_CODE_BYTES = int(os.getenv("DIAGNOSTICS_MAX_CODE_BYTES", "20000"))
+
+# Beginner-friendly hints keyed on the compiler message
+_HINTS = [
+    (r"expected ':'", "A line that starts a block (`if`, `elif`, `else`, `for`, `while`, `def`) must end with a colon `:`."),
+    (r"expected an indented block", "The lines inside a block must be indented (moved right by 4 spaces) under the line that ends with `:`."),
+    (r"unexpected indent", "This line is indented more than it should be. Lines outside a block must start at the same level as the lines around them."),
+    (r"unindent does not match", "The indentation of this line does not match any block above it. Use the same number of spaces for every line in a block."),
+    (r"Missing parentheses in call to 'print'", "In Python 3, `print` is a function, so the values must be inside brackets, like `print(value)`."),
+    (r"unterminated string literal|EOL while scanning", "A string was opened with a quote but never closed. Add the matching quote at the end of the string."),
+    (r"unterminated triple-quoted string", "A triple-quoted string was never closed. Add the matching `'''` or `\"\"\"`."),
+    (r"was never closed", "A bracket was opened but never closed. Check that every `(`, `[` and `{` has its matching closing bracket."),
+    (r"unmatched|does not match opening parenthesis", "There is a closing bracket without a matching opening bracket, or the brackets are of different types."),
+    (r"invalid character", "This line contains a character Python does not understand, often a curly quote or symbol copied from a document. Retype it using the keyboard."),
+    (r"cannot assign to|cannot be assigned", "The left side of `=` must be a variable name. To compare values, use `==` instead."),
+    (r"invalid decimal literal", "A variable name cannot start with a number, and numbers cannot have letters inside them."),
+    (r"'return' outside function", "`return` can only be used inside a function defined with `def`."),
+    (r"'break' outside loop|'continue' not properly in loop", "`break` and `continue` can only be used inside a `for` or `while` loop."),
+]
+_HINT_PATTERNS = [(re.compile(pattern), hint) for pattern, hint in _HINTS]
+_DEFAULT_HINT = "Python could not understand this line. Check the spelling of keywords, the brackets and the operators used on it."
+
+_pool = None
+
+
+def check_syntax(code):
+    """Compile `code` and describe the first syntax error, or return None.
+
+    Runs inside the diagnostics process pool, so it must stay importable and
+    free of event-loop state.
+    """
+    try:
+        compile(code, "<student_code>", "exec")
+    except SyntaxError as error:
+        return {
+            "type": type(error).__name__,
+            "message": error.msg,
+            "line": error.lineno,
+            "column": error.offset,
+            "text": (error.text or "").rstrip("\n"),
+        }
+    except (ValueError, MemoryError, RecursionError) as error:
+        return {"type": type(error).__name__, "message": str(error), "line": None, "column": None, "text": ""}
+    return None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=DIAGNOSTICS_WORKERS,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+    return _pool
+
+
+def _replace_pool():
+    """Terminate the pool's workers and start a fresh pool: a compile that
+    overran its deadline keeps its worker busy, and once a worker has died
+    the pool is broken and fails every later call."""
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+    return _get_pool()
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def diagnose(code):
+    """Return the syntax diagnostic for `code`, or None when it compiles or the
+    stage is skipped (disabled, oversized input, deadline exceeded or a
+    broken worker pool)."""
+    if DIAGNOSTICS_MODE == "off" or len(code.encode("utf-8")) > DIAGNOSTICS_MAX_CODE_BYTES:
+        return None
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        loop = asyncio.get_running_loop()
+        diagnostic = await asyncio.wait_for(
+            loop.run_in_executor(_get_pool(), check_syntax, code), DIAGNOSTICS_TIMEOUT
+        )
+        if diagnostic is not None:
+            outcome = "error"
+        return diagnostic
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        _replace_pool()
+        return None
+    except BrokenProcessPool:
+        # A worker crashed or was killed (e.g. by the OOM killer), not slow code
+        outcome = "pool_error"
+        _replace_pool()
+        return None
+    finally:
+        metrics.DIAGNOSTICS_SECONDS.labels(outcome=outcome).observe(time.perf_counter() - started)
+
+
+def hint_for(diagnostic):
+    for pattern, hint in _HINT_PATTERNS:
+        if pattern.search(diagnostic["message"]):
+            return hint
+    return _DEFAULT_HINT
+
+
+def _location(diagnostic):
+    if diagnostic["line"] is None:
+        return "your code"
+    if diagnostic["column"]:
+        return f"line {diagnostic['line']}, column {diagnostic['column']}"
+    return f"line {diagnostic['line']}"
+
+
+def answer(diagnostic):
+    """Templated "Mistake-1" reply following the prompt's <StandardResponseFormat>."""
+    code_block = ""
+    if diagnostic["text"].strip():
+        pointer = ""
+        if diagnostic["column"] and diagnostic["column"] > 0:
+            pointer = "\n" + " " * (diagnostic["column"] - 1) + "^"
+        code_block = f"\n\n```python\n{diagnostic['text']}{pointer}\n```"
+    return f"""<StudentResponse>
+Hi,
+
+From your code I observed that:
+
+**Mistake-1**: Python reports a `{diagnostic['type']}` at {_location(diagnostic)}: {diagnostic['message']}.{code_block}
+
+**Approach**: {hint_for(diagnostic)} Fix this line and run your code again.
+
+Mark the discussion as clarified if your issue is resolved.
+
+Happy Coding!
+</StudentResponse>"""
+
+
+def prompt_block(diagnostic):
+    """Compact compiler report for the prompt so the model can skip its own syntax pass."""
+    if diagnostic is None:
+        return ""
+    return (
+        "\n<compiler_diagnostics>\n"
+        "The student code was compiled with Python before this request; the syntax "
+        "validation pass is already done, use this result instead of repeating it.\n"
+        f"- error: {diagnostic['type']}: {diagnostic['message']}\n"
+        f"- location: {_location(diagnostic)}\n"
+        f"- line text: {diagnostic['text'].strip()}\n"
+        "</compiler_diagnostics>\n"
+    )
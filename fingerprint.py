@@ -0,0 +1,185 @@
+import ast
+import builtins
+import hashlib
+import keyword
+import re
+from collections import namedtuple
+
+# digest: hash of the canonical program; names: original identifier -> canonical
+# placeholder; kind: "ast" when the code parsed, "tokens" for the fallback
+Fingerprint = namedtuple("Fingerprint", ["digest", "names", "kind"])
+
+_BUILTINS = frozenset(dir(builtins))
+_TOKEN = re.compile(
+    r"""(?P<comment>\#[^\n]*)
+      |(?P<string>[rRbBuUfF]{0,2}(?:'''[\s\S]*?(?:'''|$)|\"\"\"[\s\S]*?(?:\"\"\"|$)|'[^'\n]*'?|"[^"\n]*"?))
+      |(?P<name>[A-Za-z_][A-Za-z0-9_]*)
+      |(?P<number>\d[\d_]*(?:\.\d*)?(?:[eE][+-]?\d+)?)
+      |(?P<newline>\n[ \t]*)
+      |(?P<space>[ \t]+)
+      |(?P<op>.)""",
+    re.VERBOSE,
+)
+
+
+def _is_docstring(node):
+    return (
+        isinstance(node, ast.Expr)
+        and isinstance(node.value, ast.Constant)
+        and isinstance(node.value.value, str)
+    )
+
+
+class _BindingCollector(ast.NodeVisitor):
+    """Find the names a program binds itself, in source order."""
+
+    def __init__(self):
+        self.bound = []
+        self.defined = set()
+
+    def _bind(self, name):
+        if name not in self.bound:
+            self.bound.append(name)
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, (ast.Store, ast.Del)):
+            self._bind(node.id)
+
+    def visit_arg(self, node):
+        self._bind(node.arg)
+
+    def visit_ExceptHandler(self, node):
+        if node.name:
+            self._bind(node.name)
+        self.generic_visit(node)
+
+    def visit_FunctionDef(self, node):
+        # Function and class names are part of what a question checks for
+        self.defined.add(node.name)
+        self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node):
+        self.defined.add(node.name)
+        self.generic_visit(node)
+
+
+class _Canonicalizer(ast.NodeTransformer):
+    def __init__(self, renames):
+        self.renames = renames
+
+    def _strip_docstring(self, node):
+        if node.body and _is_docstring(node.body[0]):
+            node.body = node.body[1:] or [ast.Pass()]
+        return node
+
+    def visit_Module(self, node):
+        self.generic_visit(node)
+        return self._strip_docstring(node)
+
+    def visit_FunctionDef(self, node):
+        self.generic_visit(node)
+        return self._strip_docstring(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+    visit_ClassDef = visit_FunctionDef
+
+    def visit_Name(self, node):
+        node.id = self.renames.get(node.id, node.id)
+        return node
+
+    def visit_arg(self, node):
+        node.arg = self.renames.get(node.arg, node.arg)
+        node.annotation = None
+        return node
+
+    def visit_ExceptHandler(self, node):
+        if node.name:
+            node.name = self.renames.get(node.name, node.name)
+        self.generic_visit(node)
+        return node
+
+
+def _ast_fingerprint(code):
+    tree = ast.parse(code)
+    collector = _BindingCollector()
+    collector.visit(tree)
+    renames = {}
+    for name in collector.bound:
+        if name in collector.defined or name == "self":
+            continue
+        renames[name] = f"v{len(renames)}"
+    tree = _Canonicalizer(renames).visit(tree)
+    canonical = ast.dump(tree, annotate_fields=False, include_attributes=False)
+    return canonical, renames
+
+
+def _token_fingerprint(code):
+    # Fallback for code that does not parse: rename identifiers in order of
+    # appearance, drop comments, unify string quotes and intra-line spacing
+    renames = {}
+    parts = []
+    for match in _TOKEN.finditer(code.replace("\r\n", "\n").replace("\t", "    ")):
+        kind, text = match.lastgroup, match.group()
+        if kind in ("comment", "space"):
+            continue
+        if kind == "newline":
+            line_indent = text[1:]
+            if parts and parts[-1].startswith("\n"):
+                parts[-1] = "\n" + line_indent
+            else:
+                parts.append("\n" + line_indent)
+            continue
+        if kind == "name" and not keyword.iskeyword(text) and text not in _BUILTINS:
+            if text not in renames:
+                renames[text] = f"v{len(renames)}"
+            text = renames[text]
+        elif kind == "string":
+            body = text.lstrip("rRbBuUfF")
+            prefix = text[: len(text) - len(body)].lower()
+            quote = body[:3] if body[:3] in ("'''", '"""') else body[:1]
+            inner = body[len(quote):]
+            if inner.endswith(quote):
+                inner = inner[: -len(quote)]
+            text = prefix + "'" + inner + "'"
+        parts.append(text)
+    return " ".join(parts).strip(), renames
+
+
+def fingerprint_code(code):
+    """Hash `code` so alpha-equivalent programs share a digest."""
+    try:
+        canonical, renames = _ast_fingerprint(code)
+        kind = "ast"
+    except (SyntaxError, ValueError, RecursionError):
+        canonical, renames = _token_fingerprint(code)
+        kind = "tokens"
+    digest = hashlib.sha256(f"{kind}\x1f{canonical}".encode("utf-8")).hexdigest()
+    return Fingerprint(digest, renames, kind)
+
+
+_CODE_SPAN = re.compile(r"```.*?```|`[^`\n]+`", re.DOTALL)
+
+
+def translate_identifiers(text, source_names, target_names):
+    """Rewrite identifiers of one program into another's inside code spans.
+
+    `source_names` and `target_names` map original identifiers to the shared
+    canonical placeholders. Prose outside backticks is left untouched so
+    single-letter names never clobber ordinary words.
+    """
+    canonical_to_target = {canonical: name for name, canonical in target_names.items()}
+    mapping = {
+        name: canonical_to_target[canonical]
+        for name, canonical in source_names.items()
+        if canonical in canonical_to_target and canonical_to_target[canonical] != name
+    }
+    if not mapping:
+        return text
+    pattern = re.compile(r"\b(" + "|".join(map(re.escape, sorted(mapping, key=len, reverse=True))) + r")\b")
+
+    def rewrite_span(match):
+        return pattern.sub(lambda name: mapping[name.group()], match.group())
+
+    return _CODE_SPAN.sub(rewrite_span, text)
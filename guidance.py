@@ -0,0 +1,233 @@
+"""Pre-generated Implementation Guidance answers.
+
+A submission without code of its own (empty, comments only, or the
+question's starter code) gets the prompt's Implementation Guidance answer,
+which depends only on the question. This module generates those answers
+offline, one per question, and the backend serves them from SQLite:
+
+    python -m guidance --concurrency 4            # every question not yet current
+    python -m guidance --force q1 q2              # regenerate some questions
+
+Each answer is committed as soon as it arrives, so an interrupted run picks
+up where it stopped. Answers are tagged with the question version and a
+digest of its text; editing a question makes its answer stale until the
+next run.
+"""
+import argparse
+import ast
+import asyncio
+import hashlib
+import os
+import sys
+import time
+
+import budgets
+import coalesce
+import metrics
+import prompts
+import question_store
+import upstream
+from cache import normalize_code
+from question_parsing import split_solution
+from shared_db import SharedDatabase
+
+GUIDANCE_ENABLED = os.getenv("GUIDANCE_ENABLED", "1") == "1"
+GUIDANCE_DB_PATH = os.getenv(
+    "GUIDANCE_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "guidance.sqlite3")
+)
+# Questions generated at once by the offline pipeline
+GUIDANCE_CONCURRENCY = int(os.getenv("GUIDANCE_CONCURRENCY", "4"))
+# The student query the answers are generated for
+GUIDANCE_QUERY = os.getenv("GUIDANCE_QUERY", "How do I get started on this question?")
+
+CATEGORY = "implementation_guidance"
+
+
+def details_digest(details):
+    return hashlib.sha256(details.encode("utf-8")).hexdigest()
+
+
+def _is_stub(node):
+    # Docstrings, `pass` and `...` only; classes may hold stub methods
+    for statement in node.body:
+        if isinstance(statement, ast.Pass):
+            continue
+        if isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Constant):
+            continue
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and _is_stub(statement):
+            continue
+        return False
+    return True
+
+
+def is_starter_code(code, question_details):
+    """True when `code` holds nothing the student wrote: it is empty or
+    comments only, or made of empty function/class stubs plus a few lines
+    taken from the reference solution (the driver code a question comes
+    with). Reference lines past budgets.PARTIAL_CODE_RATIO of the solution
+    are the student's own work, not a starter."""
+    code = normalize_code(code)
+    if not code:
+        return True
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return False
+    _, solution = split_solution(question_details)
+    solution_lines = [line.strip() for line in normalize_code(solution).splitlines() if line.strip()]
+    reference = set(solution_lines)
+    borrowed = 0
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if not _is_stub(node):
+                return False
+        elif not isinstance(node, (ast.Pass, ast.Import, ast.ImportFrom)) and not (
+            isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant)
+        ):
+            lines = [line.strip() for line in (ast.get_source_segment(code, node) or "").splitlines()]
+            if not all(line in reference for line in lines):
+                return False
+            borrowed += len(lines)
+    return borrowed < budgets.PARTIAL_CODE_RATIO * len(solution_lines)
+
+
+def _match(row, version, details):
+    if row is None:
+        return "miss", None
+    stored_version, digest, response = row
+    if stored_version != version or digest != details_digest(details):
+        return "stale", None
+    return "hit", response
+
+
+class GuidanceStore(SharedDatabase):
+    """One pre-generated answer per question."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS guidance (
+            question_id TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            digest TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path=GUIDANCE_DB_PATH):
+        super().__init__(path)
+
+    def get(self, question_id):
+        """(version, digest, response) stored for a question, or None."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT version, digest, response FROM guidance WHERE question_id = ?", (question_id,)
+            ).fetchone()
+
+    def current(self, question_id, version, details):
+        """The stored answer if it was generated from this version of the question."""
+        return _match(self.get(question_id), version, details)[1]
+
+    def set(self, question_id, version, details, response):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO guidance VALUES (?, ?, ?, ?, ?)",
+                (question_id, version, details_digest(details), response, time.time()),
+            )
+
+    def prune(self, question_ids):
+        """Drop answers of questions no longer in the catalogue."""
+        keep = set(question_ids)
+        with self._lock:
+            stored = [row[0] for row in self._conn.execute("SELECT question_id FROM guidance")]
+            removed = [question_id for question_id in stored if question_id not in keep]
+            self._conn.executemany("DELETE FROM guidance WHERE question_id = ?", [(q,) for q in removed])
+        return len(removed)
+
+    async def lookup(self, question_id, version, details):
+        result, response = _match(await asyncio.to_thread(self.get, question_id), version, details)
+        metrics.GUIDANCE_LOOKUPS.labels(result=result).inc()
+        return response
+
+
+async def generate(question_id, details):
+    """Implementation Guidance answer for a submission with no code."""
+    messages = prompts.assemble(question_id, details, GUIDANCE_QUERY, "").messages
+    response, outcome = await budgets.answer(messages, CATEGORY, coalesce.complete)
+    if outcome not in budgets.CACHEABLE_OUTCOMES:
+        # Stored answers are served for as long as the question is unchanged
+        raise RuntimeError(f"{outcome} answer")
+    return response
+
+
+async def pregenerate(questions, store, question_ids, concurrency=GUIDANCE_CONCURRENCY, force=False):
+    """Generate answers for `question_ids` that are missing or stale.
+
+    Returns (generated, skipped, failed) counts.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    pending = []
+    for question_id in question_ids:
+        entry = questions.entry(question_id)
+        if entry is None:
+            print(f"{question_id}: not in the catalogue", file=sys.stderr)
+            continue
+        details, version = entry
+        if force or store.current(question_id, version, details) is None:
+            pending.append((question_id, details, version))
+    skipped = len(question_ids) - len(pending)
+    failed = 0
+    done = 0
+
+    async def run(question_id, details, version):
+        nonlocal failed, done
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await generate(question_id, details)
+            except Exception as e:
+                failed += 1
+                print(f"{question_id}: failed: {e}", file=sys.stderr)
+                return
+            await asyncio.to_thread(store.set, question_id, version, details, response)
+            done += 1
+            print(
+                f"[{done + failed}/{len(pending)}] {question_id} v{version} "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+
+    await asyncio.gather(*(run(*item) for item in pending))
+    return done, skipped, failed
+
+
+async def _main(args):
+    questions = question_store.open_store()
+    store = GuidanceStore(args.db)
+    try:
+        question_ids = args.question_ids or list(questions)
+        if args.limit is not None:
+            question_ids = question_ids[:args.limit]
+        generated, skipped, failed = await pregenerate(questions, store, question_ids, args.concurrency, args.force)
+        if not args.question_ids:
+            pruned = store.prune(questions)
+            if pruned:
+                print(f"removed {pruned} answers of deleted questions")
+        print(f"{generated} generated, {skipped} already current, {failed} failed")
+        return 1 if failed else 0
+    finally:
+        await upstream.close_client()
+        store.close()
+        questions.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("question_ids", nargs="*", help="questions to generate (default: the whole catalogue)")
+    parser.add_argument("--concurrency", type=int, default=GUIDANCE_CONCURRENCY)
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many questions")
+    parser.add_argument("--force", action="store_true", help="regenerate answers that are still current")
+    parser.add_argument("--db", default=GUIDANCE_DB_PATH)
+    sys.exit(asyncio.run(_main(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from collections import Counter, namedtuple
+
+import metrics
+import telemetry
+from shared_db import SharedDatabase
+
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "1") == "1"
+JOBS_DB_PATH = os.getenv(
+    "JOBS_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.sqlite3")
+)
+# Jobs answered at once by each backend process
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "8"))
+# Finished jobs (and their results) are kept this long
+JOBS_TTL_SECONDS = float(os.getenv("JOBS_TTL_SECONDS", "3600"))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+# A running job whose lease is not renewed (its process died) is picked up again
+JOBS_LEASE_SECONDS = float(os.getenv("JOBS_LEASE_SECONDS", "60"))
+# How often idle workers and subscribers look for work done by other processes
+JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", "1"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+Job = namedtuple(
+    "Job",
+    [
+        "id", "request_hash", "payload", "status", "result", "error", "headers",
+        "attempts", "created_at", "started_at", "finished_at", "expires_at",
+    ],
+)
+_COLUMNS = ", ".join(Job._fields)
+
+
+class RetryLater(Exception):
+    """Raised by a job handler when the job should run again after a pause."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _job(row):
+    if row is None:
+        return None
+    row = list(row)
+    row[2] = json.loads(row[2])
+    row[6] = json.loads(row[6]) if row[6] else {}
+    return Job(*row)
+
+
+class JobStore(SharedDatabase):
+    """Persistent job queue shared by every worker on the host."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            request_hash TEXT NOT NULL UNIQUE,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            headers TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            expires_at REAL,
+            available_at REAL NOT NULL,
+            lease_until REAL
+        );
+        CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, available_at);
+    """
+
+    def _get(self, job_id):
+        row = self._conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job(row)
+
+    def submit(self, request_hash, payload):
+        """Queue a job unless one for the same request is queued, running or
+        finished within its TTL. Returns (job, created)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT {_COLUMNS} FROM jobs WHERE request_hash = ?", (request_hash,)
+                ).fetchone()
+                existing = _job(row)
+                if existing is not None:
+                    if existing.status != FAILED and (existing.expires_at is None or existing.expires_at > now):
+                        self._conn.execute("COMMIT")
+                        return existing, False
+                    # Failed or expired: submitting again starts over
+                    self._conn.execute("DELETE FROM jobs WHERE id = ?", (existing.id,))
+                job_id = uuid.uuid4().hex
+                self._conn.execute(
+                    """
+                    INSERT INTO jobs (id, request_hash, payload, status, created_at, available_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (job_id, request_hash, json.dumps(payload), QUEUED, now, now),
+                )
+                job = self._get(job_id)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job, True
+
+    def claim(self, lease):
+        """Take the oldest runnable job: queued and due, or running under an
+        expired lease. Returns None when there is none."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    """
+                    SELECT id FROM jobs
+                    WHERE (status = ? AND available_at <= ?) OR (status = ? AND lease_until < ?)
+                    ORDER BY created_at LIMIT 1
+                    """,
+                    (QUEUED, now, RUNNING, now),
+                ).fetchone()
+                job = None
+                if row is not None:
+                    self._conn.execute(
+                        """
+                        UPDATE jobs SET status = ?, started_at = ?, lease_until = ?, attempts = attempts + 1
+                        WHERE id = ?
+                        """,
+                        (RUNNING, now, now + lease, row[0]),
+                    )
+                    job = self._get(row[0])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job
+
+    def renew(self, job_id, lease):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ?",
+                (time.time() + lease, job_id, RUNNING),
+            )
+
+    def finish(self, job_id, status, result=None, error=None, headers=None, ttl=JOBS_TTL_SECONDS):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE jobs SET status = ?, result = ?, error = ?, headers = ?, finished_at = ?,
+                    expires_at = ?, lease_until = NULL
+                WHERE id = ?
+                """,
+                (status, result, error, json.dumps(headers or {}), now, now + ttl, job_id),
+            )
+
+    def requeue(self, job_id, delay=0.0, error=None, count_attempt=True):
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE jobs SET status = ?, available_at = ?, error = ?, lease_until = NULL,
+                    attempts = attempts - ?
+                WHERE id = ?
+                """,
+                (QUEUED, time.time() + delay, error, 0 if count_attempt else 1, job_id),
+            )
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._get(job_id)
+        if job is not None and job.expires_at is not None and job.expires_at <= time.time():
+            return None
+        return job
+
+    def queued(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+    def purge_expired(self):
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM jobs WHERE expires_at <= ?", (time.time(),)
+            ).rowcount
+
+
+class JobQueue:
+    """Fixed pool of workers draining the persistent queue in this process.
+
+    `handler(job)` answers one job and returns (result, headers). Several
+    processes can share one database; each claims jobs under a lease that
+    its workers keep renewing, so the jobs of a process that died are
+    picked up by the others, or by the same process after a restart.
+    """
+
+    def __init__(self, handler, path=JOBS_DB_PATH, workers=JOBS_WORKERS):
+        self.handler = handler
+        self.workers = workers
+        self.store = JobStore(path)
+        self._wakeup = asyncio.Event()
+        self._watchers = {}  # job id -> Event set when the job changes state
+        self._waiters = Counter()  # job id -> subscribers waiting on its Event
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._maintain()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def close(self):
+        self.store.close()
+
+    async def submit(self, request_hash, payload):
+        job, created = await asyncio.to_thread(self.store.submit, request_hash, payload)
+        metrics.JOBS_SUBMITTED.labels(result="created" if created else "existing").inc()
+        if created:
+            self._wakeup.set()
+        return job, created
+
+    async def get(self, job_id):
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def wait(self, job_id, timeout=JOBS_POLL_INTERVAL):
+        """Wait until the job changes state in this process, or `timeout`
+        passes (it may be running in another process)."""
+        event = self._watchers.setdefault(job_id, asyncio.Event())
+        self._waiters[job_id] += 1
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # Jobs run by another process are never notified here
+            self._waiters[job_id] -= 1
+            if not self._waiters[job_id]:
+                del self._waiters[job_id]
+                self._watchers.pop(job_id, None)
+
+    def _notify(self, job_id):
+        event = self._watchers.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def _worker(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                job = await asyncio.to_thread(self.store.claim, JOBS_LEASE_SECONDS)
+            except sqlite3.Error as e:
+                print(f"jobs: claim failed: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), JOBS_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _heartbeat(self, job_id):
+        while True:
+            await asyncio.sleep(JOBS_LEASE_SECONDS / 3)
+            await asyncio.to_thread(self.store.renew, job_id, JOBS_LEASE_SECONDS)
+
+    async def _run(self, job):
+        if job.attempts == 1:
+            metrics.JOB_QUEUE_SECONDS.observe(max(0.0, job.started_at - job.created_at))
+        self._notify(job.id)
+        request_token = telemetry.REQUEST_ID.set(job.id)
+        endpoint_token = telemetry.ENDPOINT.set("jobs")
+        heartbeat = asyncio.create_task(self._heartbeat(job.id))
+        try:
+            if job.attempts > JOBS_MAX_ATTEMPTS:
+                raise RuntimeError(f"Gave up after {JOBS_MAX_ATTEMPTS} attempts.")
+            result, headers = await self.handler(job)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job straight back instead of letting the lease run out
+            self.store.requeue(job.id, count_attempt=False)
+            raise
+        except RetryLater as e:
+            if job.attempts >= JOBS_MAX_ATTEMPTS:
+                await asyncio.to_thread(self.store.finish, job.id, FAILED, error=str(e))
+                metrics.JOBS_FINISHED.labels(status=FAILED).inc()
+            else:
+                await asyncio.to_thread(self.store.requeue, job.id, e.retry_after, str(e))
+                metrics.JOBS_FINISHED.labels(status="requeued").inc()
+        except Exception as e:
+            await asyncio.to_thread(self.store.finish, job.id, FAILED, error=f"An error occurred: {str(e)}")
+            metrics.JOBS_FINISHED.labels(status=FAILED).inc()
+        else:
+            await asyncio.to_thread(self.store.finish, job.id, SUCCEEDED, result, headers=headers)
+            metrics.JOBS_FINISHED.labels(status=SUCCEEDED).inc()
+        finally:
+            heartbeat.cancel()
+            telemetry.REQUEST_ID.reset(request_token)
+            telemetry.ENDPOINT.reset(endpoint_token)
+            self._notify(job.id)
+
+    async def _maintain(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.store.purge_expired)
+                metrics.JOBS_QUEUED.set(await asyncio.to_thread(self.store.queued))
+            except sqlite3.Error as e:
+                print(f"jobs: maintenance failed: {e}")
+            await asyncio.sleep(max(JOBS_POLL_INTERVAL, 10))
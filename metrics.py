@@ -0,0 +1,322 @@
+import multiprocessing
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+# Directory where every uvicorn worker of a host writes its samples, so one
+# scrape of /metrics sees all of them; empty it before the server starts.
+# Unset, /metrics reports only the worker that answered the scrape, which
+# is only right with a single worker per scrape target. Gauges say how the
+# workers' values combine (multiprocess_mode); "live" ones drop workers
+# that shut down
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Buckets sized for LLM calls: sub-second local paths up to multi-minute reasoning
+LATENCY_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 90, 120, 180)
+
+STREAM_FIRST_VISIBLE_BYTE = Histogram(
+    "pymebot_stream_first_visible_byte_seconds",
+    "Time from request arrival to the first student-visible byte on /api/submit/stream",
+    buckets=LATENCY_BUCKETS,
+)
+STREAM_UPSTREAM_FIRST_TOKEN = Histogram(
+    "pymebot_stream_upstream_first_token_seconds",
+    "Time from request arrival to the first token received from the upstream model",
+    buckets=LATENCY_BUCKETS,
+)
+STREAM_TOTAL = Histogram(
+    "pymebot_stream_total_seconds",
+    "Total duration of a streamed response",
+    buckets=LATENCY_BUCKETS,
+)
+
+CACHE_LOOKUPS = Counter(
+    "pymebot_cache_lookups_total",
+    "Response cache lookups by key kind (exact text or code fingerprint), tier and result",
+    ["kind", "tier", "result"],
+)
+
+CLASSIFIER_DECISIONS = Counter(
+    "pymebot_classifier_decisions_total",
+    "Local pre-classifier outcomes: answered as portal/administrative or forwarded upstream",
+    ["decision"],
+)
+
+DIAGNOSTICS_SECONDS = Histogram(
+    "pymebot_diagnostics_seconds",
+    "Latency of the local syntax diagnostics stage by outcome (ok, error, timeout, pool_error)",
+    ["outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+
+SANDBOX_SECONDS = Histogram(
+    "pymebot_sandbox_seconds",
+    "Latency of running student code against the reference examples by outcome",
+    ["outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+SANDBOX_REFERENCE_QUESTIONS = Gauge(
+    "pymebot_sandbox_reference_questions",
+    "Questions with precomputed reference outputs",
+    multiprocess_mode="livemax",
+)
+
+PROMPT_TOKENS = Histogram(
+    "pymebot_prompt_tokens",
+    "Estimated prompt tokens sent upstream per segment: system and question form the "
+    "cacheable prefix, student is the per-request suffix",
+    ["segment"],
+    buckets=(50, 100, 250, 500, 1000, 1500, 2000, 2500, 3000, 4000, 5000, 8000),
+)
+
+UPSTREAM_CALLS = Counter(
+    "pymebot_upstream_calls_total",
+    "Requests needing the model, by whether they originated an upstream call or "
+    "joined an identical one already in flight",
+    ["mode", "role"],
+)
+
+UPSTREAM_MODEL_SECONDS = Histogram(
+    "pymebot_upstream_model_seconds",
+    "Time until a model answered (full completion, or first delta when streaming) by outcome",
+    ["model", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+ROUTER_DECISIONS = Counter(
+    "pymebot_router_decisions_total",
+    "Upstream requests sent per model by role: primary, hedge or failover",
+    ["model", "role"],
+)
+ROUTER_HEDGE_OUTCOMES = Counter(
+    "pymebot_router_hedge_outcomes_total",
+    "Hedged calls by which request answered first",
+    ["winner"],
+)
+ROUTER_LATENCY_ESTIMATE = Gauge(
+    "pymebot_router_latency_estimate_seconds",
+    "Rolling latency percentiles the router ranks models by",
+    ["model", "quantile"],
+    multiprocess_mode="liveall",
+)
+ROUTER_ERROR_RATE = Gauge(
+    "pymebot_router_error_rate",
+    "Rolling error rate per model",
+    ["model"],
+    multiprocess_mode="liveall",
+)
+
+UPSTREAM_RETRIES = Counter(
+    "pymebot_upstream_retries_total",
+    "Upstream calls retried after a retryable error",
+    ["model", "reason"],
+)
+BREAKER_STATE = Gauge(
+    "pymebot_breaker_state",
+    "Circuit breaker state per model: 0 closed, 1 half-open, 2 open",
+    ["model"],
+    multiprocess_mode="liveall",
+)
+BREAKER_TRANSITIONS = Counter(
+    "pymebot_breaker_transitions_total",
+    "Circuit breaker state changes per model",
+    ["model", "state"],
+)
+DEGRADED_RESPONSES = Counter(
+    "pymebot_degraded_responses_total",
+    "Requests made while no model was available, by what was served (cached, guidance, unavailable)",
+    ["result"],
+)
+
+ADMISSION_REJECTIONS = Counter(
+    "pymebot_admission_rejections_total",
+    "Requests turned away with 429 by reason: rate_limited, queue_full or evicted",
+    ["reason"],
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "pymebot_admission_queue_depth",
+    "Upstream calls waiting for a slot by priority class",
+    ["priority"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_ACTIVE = Gauge(
+    "pymebot_admission_active",
+    "Upstream calls holding a slot",
+    multiprocess_mode="livesum",
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "pymebot_admission_wait_seconds",
+    "Time spent waiting for an upstream slot by priority class",
+    ["priority"],
+    buckets=LATENCY_BUCKETS,
+)
+
+CATALOGUE_QUESTIONS = Gauge(
+    "pymebot_catalogue_questions",
+    "Questions in the catalogue this worker is serving",
+    multiprocess_mode="livemax",
+)
+CATALOGUE_CHANGES = Counter(
+    "pymebot_catalogue_changes_total",
+    "Questions inserted, updated or deleted by catalogue reloads",
+    ["source"],
+)
+CATALOGUE_PROPAGATION_SECONDS = Histogram(
+    "pymebot_catalogue_propagation_seconds",
+    "Time from a catalogue change (admin request or file write) until this worker serves it",
+    ["source"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+STAGE_SECONDS = Histogram(
+    "pymebot_stage_seconds",
+    "Latency of each stage of a submission: validation, question_lookup, cache_lookup, "
+    "prompt_build, upstream_ttft, upstream_total, serialization",
+    ["endpoint", "stage"],
+    buckets=LATENCY_BUCKETS,
+)
+RESPONSES = Counter(
+    "pymebot_responses_total",
+    "Answered submissions by where the answer came from (cache, fast_path, model, degraded); "
+    "the cache hit ratio is the cache share of the total",
+    ["endpoint", "source"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "pymebot_requests_in_flight",
+    "HTTP requests being handled by this worker",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+UPSTREAM_IN_FLIGHT = Gauge(
+    "pymebot_upstream_in_flight",
+    "Upstream HTTP calls open in this worker",
+    multiprocess_mode="livesum",
+)
+UPSTREAM_CANCELLATIONS = Counter(
+    "pymebot_upstream_cancellations_total",
+    "Upstream calls cancelled before completing because nobody was left waiting, by why the "
+    "last request left (disconnect, deadline, closed)",
+    ["reason"],
+)
+UPSTREAM_TOKENS_SAVED = Counter(
+    "pymebot_upstream_tokens_saved_total",
+    "Estimated completion tokens not generated thanks to cancelled upstream calls",
+    ["reason"],
+)
+CLIENT_DISCONNECTS = Counter(
+    "pymebot_client_disconnects_total",
+    "Requests whose client went away before the answer was ready",
+    ["endpoint"],
+)
+DEADLINE_EXCEEDED = Counter(
+    "pymebot_deadline_exceeded_total",
+    "Work not started or abandoned because the request deadline passed, by stage",
+    ["stage"],
+)
+
+COMPLETION_TOKENS = Histogram(
+    "pymebot_completion_tokens",
+    "Estimated completion tokens generated per upstream answer, by predicted query category",
+    ["category"],
+    buckets=(64, 128, 256, 512, 1024, 1536, 2048, 3072, 4096, 6144, 8192),
+)
+COMPLETION_SECONDS = Histogram(
+    "pymebot_completion_seconds",
+    "Upstream time per answer, including a repair call, by predicted query category",
+    ["category"],
+    buckets=LATENCY_BUCKETS,
+)
+COMPLETION_OUTCOMES = Counter(
+    "pymebot_completion_outcomes_total",
+    "Upstream answers by category and format outcome (well_formed, repaired, truncated, fallback, empty)",
+    ["category", "outcome"],
+)
+EARLY_STOPS = Counter(
+    "pymebot_early_stops_total",
+    "Upstream streams ended as soon as </StudentResponse> arrived",
+)
+
+GUIDANCE_LOOKUPS = Counter(
+    "pymebot_guidance_lookups_total",
+    "Pre-generated Implementation Guidance lookups by result (hit, miss, stale)",
+    ["result"],
+)
+
+STARTUP_SECONDS = Gauge(
+    "pymebot_startup_seconds",
+    "Seconds from the start of the backend import to the end of import and to readiness",
+    ["phase"],
+    multiprocess_mode="liveall",
+)
+STARTUP_STEP_SECONDS = Gauge(
+    "pymebot_startup_step_seconds",
+    "Duration of each warm-up step run at startup, retries included",
+    ["step"],
+    multiprocess_mode="liveall",
+)
+STARTUP_STEP_FAILURES = Counter(
+    "pymebot_startup_step_failures_total",
+    "Failed attempts of each warm-up step; the step is retried until it succeeds",
+    ["step"],
+)
+
+CAPTURE_RECORDS = Counter(
+    "pymebot_capture_records_total",
+    "Traffic capture records written to the log or dropped (queue full, write error)",
+    ["result"],
+)
+
+JOBS_SUBMITTED = Counter(
+    "pymebot_jobs_submitted_total",
+    "POST /api/jobs calls by whether they queued a new job or matched an existing one",
+    ["result"],
+)
+JOBS_FINISHED = Counter(
+    "pymebot_jobs_finished_total",
+    "Jobs finished by outcome (succeeded, failed) and jobs put back in the queue (requeued)",
+    ["status"],
+)
+JOBS_QUEUED = Gauge(
+    "pymebot_jobs_queued",
+    "Jobs waiting in the persistent queue, as last seen by this worker",
+    multiprocess_mode="livemostrecent",
+)
+JOB_QUEUE_SECONDS = Histogram(
+    "pymebot_job_queue_seconds",
+    "Time a job waited in the queue before a worker picked it up",
+    buckets=LATENCY_BUCKETS,
+)
+# One series per question; set METRICS_PER_QUESTION=0 for very large catalogues
+METRICS_PER_QUESTION = os.getenv("METRICS_PER_QUESTION", "1") == "1"
+QUESTION_TOKENS = Counter(
+    "pymebot_question_tokens_total",
+    "Estimated prompt and completion tokens per question",
+    ["question_id", "kind"],
+)
+
+
+def count_question_tokens(question_id, kind, tokens):
+    if METRICS_PER_QUESTION:
+        QUESTION_TOKENS.labels(question_id=question_id, kind=kind).inc(tokens)
+
+
+def render_latest():
+    registry = REGISTRY
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def partial_view():
+    """True in one of several uvicorn workers (children of its supervisor)
+    without PROMETHEUS_MULTIPROC_DIR, whose scrape would miss the others."""
+    return not PROMETHEUS_MULTIPROC_DIR and multiprocessing.parent_process() is not None
+
+
+def mark_process_dead():
+    """Drop this worker's live gauges from the aggregate; call on shutdown."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
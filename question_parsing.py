@@ -0,0 +1,44 @@
+import html
+import re
+
+# Question details come in two flavours: HTML (<hr><b>Input</b><br/>...) and
+# markdown (---\n\n#### Input\n\n...), both followed by "Solution Code:"
+SOLUTION_MARKER = "Solution Code:"
+
+_TAG = re.compile(r"<[^>]+>")
+_BREAK = re.compile(r"<br\s*/?>|</?p>|<hr\s*/?>", re.I)
+_SECTION_START = r"(?:<b>\s*{name}\s*</b>|^#+\s*{name}\s*$)"
+_SECTION_END = re.compile(r"<hr\s*/?>|^-{3,}\s*$|^#+\s+\w|" + re.escape(SOLUTION_MARKER), re.I | re.M)
+
+
+def split_solution(details):
+    """Split question details into (statement, reference solution code)."""
+    statement, marker, solution = details.partition(SOLUTION_MARKER)
+    if not marker:
+        return details, ""
+    solution = solution.strip().lstrip(",").strip()
+    if solution.startswith("```"):
+        solution = solution.split("\n", 1)[1] if "\n" in solution else ""
+        solution = solution.rsplit("```", 1)[0]
+    return statement, solution.strip("\n")
+
+
+def strip_html(text):
+    """Plain text of an HTML/markdown question fragment."""
+    text = _BREAK.sub("\n", text)
+    text = _TAG.sub("", text)
+    text = html.unescape(text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def extract_section(details, name):
+    """Plain text of the named section (e.g. "Input", "Explanation"), or ""."""
+    statement, _ = split_solution(details)
+    start = re.compile(_SECTION_START.format(name=re.escape(name)), re.I | re.M).search(statement)
+    if start is None:
+        return ""
+    body = statement[start.end():]
+    end = _SECTION_END.search(body)
+    if end is not None:
+        body = body[: end.start()]
+    return strip_html(body)
@@ -0,0 +1,193 @@
+import heapq
+import math
+import os
+import re
+from collections import Counter, OrderedDict, namedtuple
+
+from question_parsing import split_solution, strip_html
+
+# BM25 parameters
+SEARCH_K1 = float(os.getenv("SEARCH_K1", "1.2"))
+SEARCH_B = float(os.getenv("SEARCH_B", "0.75"))
+# Result pages kept per worker; any catalogue change empties it
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_MAX_TERMS = int(os.getenv("SEARCH_MAX_TERMS", "16"))
+# Multi-term queries score the questions in the top this-many postings of
+# each term (its champion list); 0 scores every matching question
+SEARCH_CHAMPIONS = int(os.getenv("SEARCH_CHAMPIONS", "256"))
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from given has have in is it its of on or that the this to was will with you "
+    "your".split()
+)
+_TITLE_LENGTH = 160
+_MARKUP = re.compile(r"[*`#]+|-{3,}")
+
+SearchHit = namedtuple("SearchHit", ["question_id", "score", "title"])
+SearchPage = namedtuple("SearchPage", ["total", "hits"])
+
+
+def tokenize(text):
+    return [token for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def searchable_text(details):
+    """Plain text of the question statement; the reference solution is
+    neither indexed nor shown."""
+    statement, _ = split_solution(details)
+    return strip_html(statement)
+
+
+def _title(text):
+    first = " ".join(_MARKUP.sub("", text).split())
+    return first if len(first) <= _TITLE_LENGTH else first[:_TITLE_LENGTH - 1].rstrip() + "…"
+
+
+class _Term:
+    """BM25 weight of one term in every question containing it, also ranked
+    from the highest weight down."""
+
+    __slots__ = ("weights", "ranked")
+
+    def __init__(self, weights):
+        self.weights = weights
+        self.ranked = sorted(weights.items(), key=lambda item: (-item[1], item[0]))
+
+
+class QuestionIndex:
+    """In-memory inverted index over the question statements, ranked by BM25.
+
+    Each term keeps its postings ordered by weight. A one-term query reads
+    the top of that list; a multi-term query scores, exactly, the union of
+    the terms' champion lists, so its cost does not grow with the catalogue
+    (a question ranked low for every term on its own can be missed).
+    Match counts come from per-term bitmaps. Weights are computed when the
+    index is built and again, term by term, on first use after a change.
+    """
+
+    def __init__(self):
+        self._postings = {}  # term -> {question id: term frequency}
+        self._bitmaps = {}  # term -> int with the bits of the questions containing it
+        self._numbers = {}  # question id -> bit number
+        self._free = []  # bit numbers of removed questions
+        self._terms = {}  # question id -> Counter of its terms
+        self._lengths = {}  # question id -> tokens
+        self._titles = {}
+        self._total_length = 0
+        self._weights = {}  # term -> _Term, for the current catalogue
+        self._pages = OrderedDict()  # (terms, page end) -> SearchPage
+
+    @classmethod
+    def build(cls, questions):
+        """Index of (question id, details) pairs."""
+        index = cls()
+        for question_id, details in questions:
+            index._add(question_id, details)
+        for term in index._postings:
+            index._term(term)
+        return index
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def _add(self, question_id, details):
+        text = searchable_text(details)
+        tokens = tokenize(text)
+        terms = Counter(tokens)
+        self._terms[question_id] = terms
+        self._lengths[question_id] = len(tokens)
+        self._titles[question_id] = _title(text)
+        self._total_length += len(tokens)
+        bit = 1 << self._numbers.setdefault(question_id, self._free.pop() if self._free else len(self._numbers))
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, {})[question_id] = frequency
+            self._bitmaps[term] = self._bitmaps.get(term, 0) | bit
+
+    def _remove(self, question_id):
+        terms = self._terms.pop(question_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._lengths.pop(question_id)
+        del self._titles[question_id]
+        number = self._numbers.pop(question_id)
+        self._free.append(number)
+        for term in terms:
+            posting = self._postings[term]
+            del posting[question_id]
+            self._bitmaps[term] &= ~(1 << number)
+            if not posting:
+                del self._postings[term]
+                del self._bitmaps[term]
+
+    def _changed(self):
+        # Document lengths and frequencies moved: every weight may have too
+        self._weights.clear()
+        self._pages.clear()
+
+    def update(self, question_id, details):
+        self._remove(question_id)
+        self._add(question_id, details)
+        self._changed()
+
+    def remove(self, question_id):
+        self._remove(question_id)
+        self._changed()
+
+    def _term(self, term):
+        cached = self._weights.get(term)
+        if cached is not None:
+            return cached
+        posting = self._postings[term]
+        count = len(self._lengths)
+        idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+        average = self._total_length / count
+        lengths = self._lengths
+        k1, b = SEARCH_K1, SEARCH_B
+        weights = {
+            question_id: idf * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * lengths[question_id] / average))
+            for question_id, frequency in posting.items()
+        }
+        cached = self._weights[term] = _Term(weights)
+        return cached
+
+    def _top(self, terms, depth):
+        """The `depth` best (question id, score) pairs for `terms`."""
+        lists = [self._term(term) for term in terms]
+        if len(lists) == 1:
+            return lists[0].ranked[:depth]
+        if SEARCH_CHAMPIONS:
+            champions = max(SEARCH_CHAMPIONS, depth)
+            candidates = {question_id for term in lists for question_id, _ in term.ranked[:champions]}
+        else:
+            candidates = set().union(*(term.weights for term in lists))
+        scores = [
+            (question_id, sum(term.weights.get(question_id, 0.0) for term in lists)) for question_id in candidates
+        ]
+        return heapq.nsmallest(depth, scores, key=lambda item: (-item[1], item[0]))
+
+    def _total(self, terms):
+        bitmap = 0
+        for term in terms:
+            bitmap |= self._bitmaps[term]
+        return bin(bitmap).count("1")
+
+    def search(self, query, offset=0, limit=20):
+        """One page of questions matching any word of `query`, best first."""
+        terms = [term for term in dict.fromkeys(tokenize(query)) if term in self._postings]
+        terms = tuple(sorted(terms[:SEARCH_MAX_TERMS]))
+        if not terms:
+            return SearchPage(0, [])
+        key = (terms, offset + limit)
+        page = self._pages.get(key)
+        if page is not None:
+            self._pages.move_to_end(key)
+        else:
+            page = self._pages[key] = SearchPage(self._total(terms), self._top(terms, offset + limit))
+            if len(self._pages) > SEARCH_CACHE_SIZE:
+                self._pages.popitem(last=False)
+        hits = [
+            SearchHit(question_id, score, self._titles[question_id])
+            for question_id, score in page.hits[offset:offset + limit]
+        ]
+        return SearchPage(page.total, hits)
@@ -0,0 +1,309 @@
+import csv
+import fcntl
+import io
+import mmap
+import os
+import struct
+import sys
+from functools import lru_cache
+
+_MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+QUESTIONS_CSV_PATH = os.getenv("QUESTIONS_CSV_PATH", os.path.join(_MODULE_DIR, "questions.csv"))
+QUESTIONS_STORE_PATH = os.getenv("QUESTIONS_STORE_PATH", os.path.join(_MODULE_DIR, "questions.store"))
+# Decoded question_details kept per worker; everything else stays in the
+# shared page cache
+QUESTIONS_LRU_SIZE = int(os.getenv("QUESTIONS_LRU_SIZE", "256"))
+# How often workers check the CSV and the store for changes; 0 disables
+QUESTIONS_WATCH_INTERVAL = float(os.getenv("QUESTIONS_WATCH_INTERVAL", "2"))
+
+# File layout: header, then `count` fixed-width index records sorted by id,
+# then the UTF-8 question_details blobs the records point into
+_MAGIC = b"PYMEQS02"
+_HEADER = struct.Struct("<8sII")  # magic, count, key width
+_POINTER = struct.Struct("<QII")  # blob offset, blob length, question version
+
+
+def _read_csv(csv_path):
+    with open(csv_path, mode="r", encoding="utf-8") as file:
+        return {row["question_id"]: row["question_details"] for row in csv.DictReader(file)}
+
+
+def _ends_with_newline(path):
+    try:
+        with open(path, mode="rb") as file:
+            file.seek(-1, os.SEEK_END)
+            return file.read(1) == b"\n"
+    except OSError:
+        return True
+
+
+def _write_csv(questions, csv_path):
+    # Written in the order given, with the file's own line endings, so an
+    # edit only touches the rows it changed
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator="\n")
+    writer.writerow(["question_id", "question_details"])
+    for question_id, details in questions.items():
+        writer.writerow([question_id, details])
+    text = output.getvalue()
+    if not _ends_with_newline(csv_path):
+        text = text[:-1]
+    temporary = f"{csv_path}.{os.getpid()}.tmp"
+    with open(temporary, mode="w", encoding="utf-8", newline="") as file:
+        file.write(text)
+    os.replace(temporary, csv_path)
+
+
+def _version(previous, question_id, details):
+    # Unchanged questions keep their version, edited ones move to the next
+    if previous is None:
+        return 1
+    entry = previous.entry(question_id)
+    if entry is None:
+        return 1
+    return entry[1] if entry[0] == details else entry[1] + 1
+
+
+def compile_store(questions, store_path, previous=None):
+    """Write `questions` (id -> details) as an indexed store, atomically.
+
+    Versions are carried over from the `previous` store and bumped for every
+    question whose details changed.
+    """
+    keys = sorted(key.encode("utf-8") for key in questions)
+    key_width = max((len(key) for key in keys), default=0)
+    record_size = key_width + _POINTER.size
+    offset = _HEADER.size + record_size * len(keys)
+    index, blobs = [], []
+    for key in keys:
+        question_id = key.decode("utf-8")
+        details = questions[question_id]
+        blob = details.encode("utf-8")
+        version = _version(previous, question_id, details)
+        index.append(key.ljust(key_width, b"\0") + _POINTER.pack(offset, len(blob), version))
+        blobs.append(blob)
+        offset += len(blob)
+    temporary = f"{store_path}.{os.getpid()}.tmp"
+    with open(temporary, mode="wb") as file:
+        file.write(_HEADER.pack(_MAGIC, len(keys), key_width))
+        file.writelines(index)
+        file.writelines(blobs)
+    os.replace(temporary, store_path)
+
+
+def _is_current(csv_path, store_path):
+    try:
+        if os.path.getmtime(store_path) < os.path.getmtime(csv_path):
+            return False
+        with open(store_path, mode="rb") as file:
+            return file.read(len(_MAGIC)) == _MAGIC
+    except FileNotFoundError:
+        if not os.path.exists(csv_path):
+            raise
+        return False
+
+
+def ensure_store(csv_path=QUESTIONS_CSV_PATH, store_path=QUESTIONS_STORE_PATH):
+    """Compile the CSV into the store unless an up-to-date store exists."""
+    if _is_current(csv_path, store_path):
+        return store_path
+    with _write_lock(store_path):
+        # Another worker may have compiled it while we waited for the lock
+        if not _is_current(csv_path, store_path):
+            compile_store(_read_csv(csv_path), store_path, _open_previous(store_path))
+    return store_path
+
+
+class _write_lock:
+    """Serialise catalogue writes across workers with an flock on a side file."""
+
+    def __init__(self, store_path):
+        self.path = f"{store_path}.lock"
+
+    def __enter__(self):
+        self.file = open(self.path, mode="a")
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+
+
+def _open_previous(store_path):
+    try:
+        return QuestionStore(store_path, lru_size=0)
+    except (FileNotFoundError, ValueError, struct.error):
+        return None
+
+
+def apply_changes(upserts=None, deletes=(), csv_path=QUESTIONS_CSV_PATH, store_path=QUESTIONS_STORE_PATH):
+    """Insert/update/delete questions and return the newly opened store.
+
+    The CSV is rewritten first so the store stays the newer file and is not
+    recompiled over; both writes are atomic renames, so readers only ever see
+    a complete catalogue.
+    """
+    with _write_lock(store_path):
+        previous = _open_previous(store_path)
+        # Changes are applied to the CSV's rows in place: existing questions
+        # keep their position and new ones are appended
+        if os.path.exists(csv_path):
+            questions = _read_csv(csv_path)
+        else:
+            questions = dict(previous.items()) if previous is not None else {}
+        for question_id in deletes:
+            questions.pop(question_id, None)
+        questions.update(upserts or {})
+        _write_csv(questions, csv_path)
+        compile_store(questions, store_path, previous)
+    return QuestionStore(store_path)
+
+
+def changed_ids(old, new):
+    """Ids inserted, updated or deleted between two stores."""
+    old_versions = dict(old.versions())
+    new_versions = dict(new.versions())
+    return {
+        question_id
+        for question_id in old_versions.keys() | new_versions.keys()
+        if old_versions.get(question_id) != new_versions.get(question_id)
+    }
+
+
+def poll(store, csv_path=QUESTIONS_CSV_PATH):
+    """Return (new store, change time) when the CSV or the store file changed
+    since `store` was opened, else None."""
+    csv_edited = not _is_current(csv_path, store.path)
+    ensure_store(csv_path, store.path)
+    stat = os.stat(store.path)
+    if (stat.st_ino, stat.st_mtime_ns) == store.file_id:
+        return None
+    # Latency is measured from the edit that started the change
+    changed_at = os.path.getmtime(csv_path) if csv_edited else stat.st_mtime
+    return QuestionStore(store.path), changed_at
+
+
+class QuestionStore:
+    """Read-only, memory-mapped question catalogue with a dict-like interface.
+
+    The index is binary searched in place, so workers share the mapped pages
+    and only decode the questions they are asked for.
+    """
+
+    def __init__(self, store_path, lru_size=QUESTIONS_LRU_SIZE):
+        self.path = store_path
+        with open(store_path, mode="rb") as file:
+            stat = os.fstat(file.fileno())
+            self.file_id = (stat.st_ino, stat.st_mtime_ns)
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count, self._key_width = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC:
+            self._map.close()
+            raise ValueError(f"{store_path} is not a question store")
+        self._record_size = self._key_width + _POINTER.size
+        self._details = lru_cache(maxsize=lru_size)(self._read_details)
+
+    def _key_at(self, position):
+        start = _HEADER.size + position * self._record_size
+        return self._map[start:start + self._key_width].rstrip(b"\0")
+
+    def _find(self, question_id):
+        key = question_id.encode("utf-8")
+        if len(key) > self._key_width:
+            return None
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count and self._key_at(low) == key:
+            return low
+        return None
+
+    def _pointer(self, position):
+        return _POINTER.unpack_from(self._map, _HEADER.size + position * self._record_size + self._key_width)
+
+    def _read_details(self, position):
+        offset, length, _ = self._pointer(position)
+        return self._map[offset:offset + length].decode("utf-8")
+
+    def get(self, question_id, default=None):
+        if not isinstance(question_id, str):
+            return default
+        position = self._find(question_id)
+        return default if position is None else self._details(position)
+
+    def version(self, question_id):
+        position = self._find(question_id) if isinstance(question_id, str) else None
+        return None if position is None else self._pointer(position)[2]
+
+    def entry(self, question_id):
+        """(details, version) of a question, or None."""
+        position = self._find(question_id) if isinstance(question_id, str) else None
+        if position is None:
+            return None
+        return self._details(position), self._pointer(position)[2]
+
+    def versions(self):
+        for position in range(self._count):
+            yield self._key_at(position).decode("utf-8"), self._pointer(position)[2]
+
+    def __getitem__(self, question_id):
+        details = self.get(question_id)
+        if details is None:
+            raise KeyError(question_id)
+        return details
+
+    def __contains__(self, question_id):
+        return isinstance(question_id, str) and self._find(question_id) is not None
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for position in range(self._count):
+            yield self._key_at(position).decode("utf-8")
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        for position in range(self._count):
+            yield self._key_at(position).decode("utf-8"), self._read_details(position)
+
+    def warm(self):
+        """Fault the mapped index and blobs into memory ahead of the first
+        lookup (after a wake-up the page cache may have been dropped)."""
+        if hasattr(mmap, "MADV_WILLNEED"):
+            self._map.madvise(mmap.MADV_WILLNEED)
+        for offset in range(0, len(self._map), mmap.PAGESIZE):
+            self._map[offset]
+        return self._count
+
+    def close(self):
+        self._details.cache_clear()
+        self._map.close()
+
+
+def open_store(csv_path=QUESTIONS_CSV_PATH, store_path=QUESTIONS_STORE_PATH):
+    return QuestionStore(ensure_store(csv_path, store_path))
+
+
+def open_snapshot(csv_path=QUESTIONS_CSV_PATH, store_path=QUESTIONS_STORE_PATH):
+    """Open the compiled store without comparing it to the CSV, compiling
+    only when there is none; poll() catches up with later CSV edits."""
+    try:
+        return QuestionStore(store_path)
+    except (FileNotFoundError, ValueError, struct.error):
+        return open_store(csv_path, store_path)
+
+
+if __name__ == "__main__":
+    # python question_store.py [questions.csv] [questions.store]
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else QUESTIONS_CSV_PATH
+    store_path = sys.argv[2] if len(sys.argv) > 2 else QUESTIONS_STORE_PATH
+    compile_store(_read_csv(csv_path), store_path)
+    print(f"compiled {len(QuestionStore(store_path))} questions into {store_path}")
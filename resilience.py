@@ -0,0 +1,139 @@
+import asyncio
+import os
+import random
+import time
+
+import deadlines
+import metrics
+
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.5"))
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "8"))
+# A 429 asking us to wait longer than this is not retried in-request
+UPSTREAM_RETRY_AFTER_MAX = float(os.getenv("UPSTREAM_RETRY_AFTER_MAX", "10"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class UpstreamUnavailable(Exception):
+    """No model could answer: every breaker is open or every attempt failed."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_retryable(error):
+    # Imported here rather than at startup: upstream loads the SDK lazily and
+    # any error classified here came out of it
+    import openai
+
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in (408, 409)
+
+
+def retry_after(error):
+    """Seconds the provider asked us to wait, or None."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt):
+    # Full jitter: spreads the retries of many students over the window
+    return random.uniform(0, min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Per-model breaker: opens after consecutive failures, lets a single
+    trial call through once the reset timeout has passed."""
+
+    def __init__(self, model):
+        self.model = model
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_running = False
+        metrics.BREAKER_STATE.labels(model=model).set(_STATE_VALUES[CLOSED])
+
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            metrics.BREAKER_STATE.labels(model=self.model).set(_STATE_VALUES[state])
+            metrics.BREAKER_TRANSITIONS.labels(model=self.model, state=state).inc()
+
+    def retry_in(self):
+        """Seconds until the breaker lets a call through again."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + BREAKER_RESET_TIMEOUT - time.monotonic())
+
+    def available(self):
+        if self.state == OPEN and self.retry_in() == 0:
+            self._set_state(HALF_OPEN)
+            self.trial_running = False
+        return self.state == CLOSED or (self.state == HALF_OPEN and not self.trial_running)
+
+    def acquire(self):
+        if self.state == HALF_OPEN:
+            self.trial_running = True
+
+    def release(self):
+        # The call ended without saying anything about the model's health
+        self.trial_running = False
+
+    def record_success(self):
+        self.failures = 0
+        self.trial_running = False
+        self._set_state(CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_running = False
+        if self.state == HALF_OPEN or self.failures >= BREAKER_FAILURE_THRESHOLD:
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+
+async def with_retries(model, call):
+    """Await `call()` again on retryable errors with jittered exponential
+    backoff, honouring Retry-After on 429s."""
+    import openai
+
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except Exception as e:
+            if attempt >= UPSTREAM_RETRIES or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt)
+            if isinstance(e, openai.RateLimitError):
+                requested = retry_after(e)
+                if requested is not None:
+                    if requested > UPSTREAM_RETRY_AFTER_MAX:
+                        raise
+                    delay = requested
+                reason = "rate_limited"
+            elif isinstance(e, openai.APIConnectionError):
+                reason = "connection"
+            else:
+                reason = "server_error"
+            left = deadlines.remaining()
+            if left is not None and left <= delay:
+                # The retry could not finish in time
+                raise
+            metrics.UPSTREAM_RETRIES.labels(model=model, reason=reason).inc()
+            attempt += 1
+            await asyncio.sleep(delay)
@@ -0,0 +1,257 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque, namedtuple
+
+import deadlines
+import metrics
+import resilience
+import upstream
+
+# Ordered, comma separated list of `model` or `model@base_url` entries; the
+# first is preferred until the latency statistics say otherwise
+UPSTREAM_MODELS = os.getenv("UPSTREAM_MODELS", upstream.UPSTREAM_MODEL)
+ROUTER_HEDGE_ENABLED = os.getenv("ROUTER_HEDGE_ENABLED", "1") == "1"
+# Hedge delay used until a model has ROUTER_MIN_SAMPLES latency samples
+ROUTER_HEDGE_DELAY = float(os.getenv("ROUTER_HEDGE_DELAY", "20"))
+ROUTER_MIN_HEDGE_DELAY = float(os.getenv("ROUTER_MIN_HEDGE_DELAY", "1"))
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW", "200"))
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "20"))
+# Models failing more often than this are only used when nothing else is left
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.5"))
+
+Endpoint = namedtuple("Endpoint", ["model", "base_url"])
+
+
+def parse_models(spec):
+    endpoints = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        model, _, base_url = entry.partition("@")
+        endpoints.append(Endpoint(model.strip(), base_url.strip() or None))
+    return endpoints
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class ModelStats:
+    """Rolling latency and error window of one model."""
+
+    def __init__(self, endpoint, position):
+        self.endpoint = endpoint
+        self.position = position
+        self.latencies = deque(maxlen=ROUTER_WINDOW)
+        self.outcomes = deque(maxlen=ROUTER_WINDOW)
+        self.breaker = resilience.CircuitBreaker(endpoint.model)
+
+    def record(self, seconds, ok):
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(seconds)
+        model = self.endpoint.model
+        metrics.ROUTER_ERROR_RATE.labels(model=model).set(self.error_rate())
+        if self.latencies:
+            metrics.ROUTER_LATENCY_ESTIMATE.labels(model=model, quantile="0.5").set(self.p50())
+            metrics.ROUTER_LATENCY_ESTIMATE.labels(model=model, quantile="0.95").set(self.p95())
+
+    def has_samples(self):
+        return len(self.latencies) >= ROUTER_MIN_SAMPLES
+
+    def p50(self):
+        return _percentile(self.latencies, 0.5) if self.latencies else None
+
+    def p95(self):
+        return _percentile(self.latencies, 0.95) if self.latencies else None
+
+    def error_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def rank(self):
+        # Healthy before failing; measured models by median latency, then
+        # unmeasured ones in configured order
+        return (
+            self.error_rate() > ROUTER_MAX_ERROR_RATE,
+            self.p50() if self.has_samples() else math.inf,
+            self.position,
+        )
+
+    def hedge_delay(self):
+        if not self.has_samples():
+            return ROUTER_HEDGE_DELAY
+        return max(ROUTER_MIN_HEDGE_DELAY, self.p95())
+
+
+class Router:
+    def __init__(self, endpoints):
+        self.models = [ModelStats(endpoint, position) for position, endpoint in enumerate(endpoints)]
+
+    def ranked(self):
+        return sorted(self.models, key=ModelStats.rank)
+
+    def snapshot(self):
+        return [
+            {
+                "model": stats.endpoint.model,
+                "baseUrl": stats.endpoint.base_url or upstream.OPENROUTER_BASE_URL,
+                "samples": len(stats.latencies),
+                "p50": stats.p50(),
+                "p95": stats.p95(),
+                "errorRate": stats.error_rate(),
+                "breaker": stats.breaker.state,
+            }
+            for stats in self.ranked()
+        ]
+
+    async def _race(self, start, messages, release=None):
+        """Run `start(stats, messages)` on the best model, hedge on the next
+        best once the first passes its p95, and return the first success.
+
+        `start` returns an awaitable whose result means the model has
+        answered (the full completion, or the first delta of a stream);
+        `release` frees the result of a loser that answered too late.
+        """
+        deadlines.check("upstream")
+        # Models whose breaker is open are skipped without a call
+        ranked = [stats for stats in self.ranked() if stats.breaker.available()]
+        if not ranked:
+            retry_in = min(stats.breaker.retry_in() for stats in self.models)
+            raise resilience.UpstreamUnavailable("Every upstream model is unavailable.", retry_in)
+        candidates = iter(ranked)
+        running = {}
+        last_error = None
+
+        def launch(role):
+            stats = next(candidates, None)
+            if stats is None or deadlines.expired():
+                return
+            stats.breaker.acquire()
+            metrics.ROUTER_DECISIONS.labels(model=stats.endpoint.model, role=role).inc()
+            task = asyncio.create_task(start(stats, messages))
+            running[task] = (stats, role, time.perf_counter())
+
+        launch("primary")
+        primary = ranked[0]
+        can_hedge = ROUTER_HEDGE_ENABLED and len(ranked) > 1
+        hedged = False
+        try:
+            while running:
+                timeout = primary.hedge_delay() if can_hedge and not hedged else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch("hedge")
+                    hedged = True
+                    continue
+                for task in done:
+                    stats, role, started = running.pop(task)
+                    elapsed = time.perf_counter() - started
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        if resilience.is_retryable(last_error):
+                            stats.breaker.record_failure()
+                        else:
+                            stats.breaker.release()
+                        stats.record(elapsed, False)
+                        metrics.UPSTREAM_MODEL_SECONDS.labels(model=stats.endpoint.model, outcome="error").observe(elapsed)
+                        continue
+                    stats.breaker.record_success()
+                    stats.record(elapsed, True)
+                    metrics.UPSTREAM_MODEL_SECONDS.labels(model=stats.endpoint.model, outcome="ok").observe(elapsed)
+                    if hedged:
+                        metrics.ROUTER_HEDGE_OUTCOMES.labels(winner=role).inc()
+                    for loser_stats, loser_role, loser_started in running.values():
+                        if loser_role == "primary":
+                            # The cancelled primary took at least this long
+                            loser_stats.record(time.perf_counter() - loser_started, True)
+                    return task.result(), stats
+                if not running:
+                    # Fail over to the next model straight away
+                    can_hedge = False
+                    launch("failover")
+            if deadlines.expired():
+                raise deadlines.exceeded("upstream") from last_error
+            if resilience.is_retryable(last_error):
+                raise resilience.UpstreamUnavailable(
+                    f"Upstream models are failing: {last_error}",
+                    resilience.retry_after(last_error) or resilience.UPSTREAM_BACKOFF_MAX,
+                ) from last_error
+            raise last_error
+        finally:
+            for task, (stats, _, _) in running.items():
+                stats.breaker.release()
+                if task.done() and not task.cancelled() and task.exception() is None:
+                    if release is not None:
+                        await release(task.result())
+                else:
+                    task.cancel()
+
+    async def complete(self, messages, **params):
+        async def start(stats, messages):
+            completion = await resilience.with_retries(
+                stats.endpoint.model,
+                lambda: upstream.create_completion(
+                    messages, model=stats.endpoint.model, base_url=stats.endpoint.base_url, **params
+                ),
+            )
+            return completion.choices[0].message.content or ""
+
+        text, _ = await self._race(start, messages)
+        return text
+
+    async def stream(self, messages, **params):
+        async def open_stream(stats, messages):
+            deltas = upstream.stream_completion(
+                messages, model=stats.endpoint.model, base_url=stats.endpoint.base_url, **params
+            )
+            try:
+                first = await deltas.__anext__()
+            except StopAsyncIteration:
+                first = ""
+            except BaseException:
+                await deltas.aclose()
+                raise
+            return first, deltas
+
+        async def start(stats, messages):
+            # Racing the first delta (retried before anything reached the
+            # student); the winner's stream is then read to the end
+            return await resilience.with_retries(stats.endpoint.model, lambda: open_stream(stats, messages))
+
+        async def release(result):
+            await result[1].aclose()
+
+        (first, deltas), _ = await self._race(start, messages, release)
+        try:
+            if first:
+                yield first
+            async for delta in deltas:
+                yield delta
+        finally:
+            await deltas.aclose()
+
+
+_router = Router(parse_models(UPSTREAM_MODELS))
+
+
+def snapshot():
+    return _router.snapshot()
+
+
+def base_urls():
+    """Distinct providers of the configured models (None is OpenRouter)."""
+    return list(dict.fromkeys(stats.endpoint.base_url for stats in _router.models))
+
+
+async def complete(messages, **params):
+    """Completion text for `messages` from the best available model."""
+    return await _router.complete(messages, **params)
+
+
+def stream(messages, **params):
+    """Async iterator of content deltas from the best available model."""
+    return _router.stream(messages, **params)
@@ -0,0 +1,578 @@
+import ast
+import asyncio
+import builtins
+import ctypes
+import difflib
+import errno
+import fcntl
+import importlib
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import re
+import resource
+import select
+import signal
+import struct
+import sys
+import time
+import traceback
+import types
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+from question_parsing import extract_section, split_solution
+
+# "annotate" adds execution results to the prompt, "answer" also replies
+# directly when the student's output matches the reference on every example,
+# "off" skips the stage
+SANDBOX_MODE = os.getenv("SANDBOX_MODE", "annotate")
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", "2"))
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "2"))
+SANDBOX_WALL_SECONDS = float(os.getenv("SANDBOX_WALL_SECONDS", "3"))
+SANDBOX_MEMORY_BYTES = int(os.getenv("SANDBOX_MEMORY_BYTES", str(256 * 1024 * 1024)))
+SANDBOX_MAX_OUTPUT_BYTES = int(os.getenv("SANDBOX_MAX_OUTPUT_BYTES", str(64 * 1024)))
+SANDBOX_REFERENCE_CACHE = os.getenv(
+    "SANDBOX_REFERENCE_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference_outputs.json"),
+)
+# Modules beginner programs may import inside the sandbox
+ALLOWED_MODULES = frozenset(
+    os.getenv(
+        "SANDBOX_ALLOWED_MODULES",
+        "math,random,string,itertools,collections,functools,operator,re,datetime,statistics,copy,fractions,decimal",
+    ).split(",")
+)
+# Builtins removed from the student's namespace; __loader__ and __spec__
+# would hand out the import machinery (and with it sys, posix, socket)
+_BLOCKED_BUILTINS = ("open", "breakpoint", "help", "compile", "__loader__", "__spec__")
+_NOBODY = 65534
+
+_pool = None
+# module name -> public view handed to student code
+_proxies = {}
+# question_id -> list of {"input": ..., "output": ...} from the reference solution
+REFERENCE_OUTPUTS = {}
+
+
+class _OutputLimitExceeded(Exception):
+    pass
+
+
+class _LimitedOutput(io.StringIO):
+    def write(self, text):
+        if self.tell() + len(text) > SANDBOX_MAX_OUTPUT_BYTES:
+            raise _OutputLimitExceeded()
+        return super().write(text)
+
+
+def _public_proxy(module):
+    """Copy of `module` with its public names only, so attributes such as
+    `random._os` or `datetime.sys` do not hand out the rest of the
+    interpreter. Submodules of allowed modules are proxied in turn."""
+    proxy = _proxies.get(module.__name__)
+    if proxy is not None:
+        return proxy
+    proxy = _proxies[module.__name__] = types.ModuleType(module.__name__, module.__doc__)
+    for name, value in vars(module).items():
+        if name.startswith("_"):
+            continue
+        if isinstance(value, types.ModuleType):
+            if value.__name__.split(".")[0] not in ALLOWED_MODULES:
+                continue
+            value = _public_proxy(value)
+        setattr(proxy, name, value)
+    if hasattr(module, "__all__"):
+        proxy.__all__ = [name for name in module.__all__ if hasattr(proxy, name)]
+    return proxy
+
+
+def _guarded_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level != 0 or name.split(".")[0] not in ALLOWED_MODULES:
+        raise ImportError(f"import of '{name}' is not allowed here")
+    return _public_proxy(__import__(name, globals, locals, fromlist, level))
+
+
+def _apply_limits():
+    resource.setrlimit(resource.RLIMIT_CPU, (SANDBOX_CPU_SECONDS, SANDBOX_CPU_SECONDS + 1))
+    resource.setrlimit(resource.RLIMIT_AS, (SANDBOX_MEMORY_BYTES, SANDBOX_MEMORY_BYTES))
+    # No file may grow past zero bytes
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    if os.getuid() == 0:
+        # Drop root so the filesystem and privileged sockets are off limits
+        os.setgroups([])
+        os.setgid(_NOBODY)
+        os.setuid(_NOBODY)
+    # No new processes (set after setuid, which the limit could otherwise block)
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+
+
+# Syscalls the child may make once the student code starts: memory, signals,
+# clocks and reading/writing fds it already holds. Anything else (open,
+# socket, unlink, rename, fork, exec, kill, ...) fails with EPERM, so
+# isolation holds even if the code gets past the builtins and import guard
+_ALLOWED_SYSCALLS = {
+    "x86_64": (
+        0xC000003E,
+        # read write close stat fstat lstat lseek mmap mprotect munmap brk
+        # rt_sigaction rt_sigprocmask rt_sigreturn sched_yield mremap madvise
+        # nanosleep getpid exit fcntl gettimeofday sigaltstack gettid futex
+        # clock_gettime clock_getres clock_nanosleep exit_group newfstatat getrandom
+        (0, 1, 3, 4, 5, 6, 8, 9, 10, 11, 12, 13, 14, 15, 24, 25, 28, 35, 39, 60, 72, 96, 131, 186, 202,
+         228, 229, 230, 231, 262, 318),
+    ),
+    "aarch64": (
+        0xC00000B7,
+        # the same calls by their arm64 numbers
+        (63, 64, 57, 80, 79, 62, 222, 226, 215, 214, 134, 135, 139, 124, 216, 233, 101, 172, 93, 25, 169,
+         132, 178, 98, 113, 114, 115, 94, 278),
+    ),
+}
+_PR_SET_NO_NEW_PRIVS = 38
+_PR_SET_SECCOMP = 22
+_SECCOMP_MODE_FILTER = 2
+
+
+class _SockFprog(ctypes.Structure):
+    _fields_ = [("len", ctypes.c_ushort), ("filter", ctypes.c_char_p)]
+
+
+def _seccomp_filter(arch, syscalls):
+    # BPF: kill on a foreign arch, allow the listed syscalls, EPERM the rest
+    def op(code, k, jt=0, jf=0):
+        return struct.pack("=HBBI", code, jt, jf, k)
+
+    program = [op(0x20, 4), op(0x15, arch, 1, 0), op(0x06, 0x80000000), op(0x20, 0)]
+    for position, number in enumerate(syscalls):
+        program.append(op(0x15, number, len(syscalls) - position, 0))
+    program += [op(0x06, 0x00050000 | errno.EPERM), op(0x06, 0x7FFF0000)]
+    return len(program), b"".join(program)
+
+
+def _restrict_syscalls():
+    """Install the seccomp allow-list; raises OSError where it cannot be
+    installed, so the code is never run unconfined."""
+    if sys.platform != "linux" or platform.machine() not in _ALLOWED_SYSCALLS:
+        raise OSError(errno.ENOSYS, "seccomp filter unavailable on this platform")
+    length, program = _seccomp_filter(*_ALLOWED_SYSCALLS[platform.machine()])
+    buffer = ctypes.create_string_buffer(program, len(program))
+    fprog = _SockFprog(length, ctypes.cast(buffer, ctypes.c_char_p))
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.prctl(_PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0) != 0 or libc.prctl(
+        _PR_SET_SECCOMP, _SECCOMP_MODE_FILTER, ctypes.byref(fprog), 0, 0
+    ) != 0:
+        raise OSError(ctypes.get_errno(), "cannot install the seccomp filter")
+
+
+def _preload_modules():
+    # Allowed modules are imported before the filter is installed, which
+    # would keep their files from being opened afterwards
+    for name in ALLOWED_MODULES:
+        try:
+            _public_proxy(importlib.import_module(name))
+        except ImportError:
+            pass
+
+
+def _close_inherited_fds(write_fd):
+    """Close every fd the child inherited (the pool's call and result queue
+    pipes among them) but the result pipe, and put /dev/null on stdio.
+
+    The seccomp filter still allows read and write on open fds, so code that
+    gets hold of `os` must find nothing else to talk to. Returns the result
+    pipe's new fd, moved past stdio.
+    """
+    result_fd = fcntl.fcntl(write_fd, fcntl.F_DUPFD, 3)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    os.closerange(3, result_fd)
+    os.closerange(result_fd + 1, resource.getrlimit(resource.RLIMIT_NOFILE)[0])
+    return result_fd
+
+
+def _error_line(error):
+    line = None
+    for frame in traceback.extract_tb(error.__traceback__):
+        if frame.filename == "<student_code>":
+            line = frame.lineno
+    return line
+
+
+def _child(code, stdin_text, write_fd):
+    # Runs in a freshly forked process; never returns
+    result = {"status": "ok"}
+    output = _LimitedOutput()
+    try:
+        os.chdir("/")
+        write_fd = _close_inherited_fds(write_fd)
+        _preload_modules()
+        _apply_limits()
+    except OSError as error:
+        _report(write_fd, {"status": "unavailable", "stdout": "", "message": str(error)})
+    try:
+        safe_builtins = dict(vars(builtins))
+        for name in _BLOCKED_BUILTINS:
+            safe_builtins.pop(name, None)
+        safe_builtins["__import__"] = _guarded_import
+        program = compile(code, "<student_code>", "exec")
+        sys.stdin = io.StringIO(stdin_text)
+        sys.stdout = output
+        sys.stderr = io.StringIO()
+        try:
+            _restrict_syscalls()
+        except OSError as error:
+            _report(write_fd, {"status": "unavailable", "stdout": "", "message": str(error)})
+        exec(program, {"__name__": "__main__", "__builtins__": safe_builtins})
+    except SystemExit:
+        pass
+    except _OutputLimitExceeded:
+        result = {"status": "output_limit"}
+    except BaseException as error:
+        result = {
+            "status": "error",
+            "error": type(error).__name__,
+            "message": str(error)[:300],
+            "line": _error_line(error),
+        }
+    result["stdout"] = output.getvalue()
+    _report(write_fd, result)
+
+
+def _report(write_fd, result):
+    # Sends the child's result to the parent and exits the child
+    try:
+        payload = json.dumps(result).encode("utf-8")
+        view = memoryview(payload)
+        while view:
+            written = os.write(write_fd, view)
+            view = view[written:]
+    finally:
+        os._exit(0)
+
+
+def run_program(code, stdin_text):
+    """Run `code` in a forked, resource-limited child and collect its output.
+
+    Called inside a sandbox pool worker; the fork keeps every run isolated
+    from the long-lived worker process.
+    """
+    read_fd, write_fd = os.pipe()
+    started = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        _child(code, stdin_text, write_fd)
+    os.close(write_fd)
+    chunks = []
+    deadline = started + SANDBOX_WALL_SECONDS
+    timed_out = False
+    try:
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                timed_out = True
+                break
+            ready, _, _ = select.select([read_fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(read_fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(read_fd)
+        if timed_out:
+            os.kill(pid, signal.SIGKILL)
+        _, wait_status = os.waitpid(pid, 0)
+    elapsed = time.perf_counter() - started
+    if timed_out:
+        return {"status": "timeout", "stdout": "", "elapsed": elapsed}
+    try:
+        result = json.loads(b"".join(chunks).decode("utf-8"))
+    except ValueError:
+        # Killed before reporting, e.g. SIGXCPU on the CPU limit
+        killed_by = os.WTERMSIG(wait_status) if os.WIFSIGNALED(wait_status) else None
+        status = "timeout" if killed_by in (signal.SIGXCPU, signal.SIGKILL) else "crashed"
+        result = {"status": status, "stdout": ""}
+    result["elapsed"] = elapsed
+    return result
+
+
+def run_examples(code, inputs):
+    return [run_program(code, stdin_text) for stdin_text in inputs]
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=SANDBOX_WORKERS,
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=_preload_modules,
+        )
+    return _pool
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def run_many(code, inputs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), run_examples, code, inputs)
+
+
+# Example-input extraction from the question's Explanation section
+_EXAMPLE_SPLIT = re.compile(r"(?i)\bfor example\b|\bsimilarly\b|\bfor instance\b|\bsample input\b")
+_OUTPUT_CUE = re.compile(r"(?i)\b(?:output|result|should be|should print|prints?|so the|so,|then)\b")
+_VALUE = re.compile(
+    r"""(?:\bis|\bare|=|:)\s+(?:the\s+)?(?:
+        "(?P<double>[^"\n]*)"|“(?P<curly>[^”\n]*)”|`(?P<code>[^`\n]*)`|\*\*(?P<bold>[^*\n]+)\*\*
+        |'(?P<single>[^'\n]*)'|(?P<number>-?\d+(?:\.\d+)?)(?![\w.]\w)
+    )""",
+    re.X,
+)
+_ASSIGNMENT = re.compile(r"^\s*\w+\s*=\s*(.+)$")
+
+
+def count_input_calls(solution):
+    """Number of input() calls, or None when they cannot be counted statically."""
+    try:
+        tree = ast.parse(solution)
+    except SyntaxError:
+        return None
+    count = 0
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.For, ast.While, ast.FunctionDef)):
+            for inner in ast.walk(node):
+                if isinstance(inner, ast.Call) and getattr(inner.func, "id", None) == "input":
+                    return None
+        elif isinstance(node, ast.Call) and getattr(node.func, "id", None) == "input":
+            count += 1
+    return count
+
+
+def extract_example_inputs(details, solution):
+    """Guess stdin for each worked example in the Explanation section.
+
+    Values named before the first mention of the output are taken in order,
+    one per input() call of the reference solution. Guesses are only kept
+    once the reference solution runs cleanly on them.
+    """
+    explanation = extract_section(details, "Explanation")
+    expected_lines = count_input_calls(solution)
+    if not explanation or not expected_lines:
+        return []
+    inputs = []
+    for segment in _EXAMPLE_SPLIT.split(explanation):
+        cue = _OUTPUT_CUE.search(segment)
+        if cue is not None:
+            segment = segment[: cue.start()]
+        values = []
+        for match in _VALUE.finditer(segment):
+            value = next(group for group in match.groups() if group is not None)
+            assignment = _ASSIGNMENT.match(value)
+            if assignment is not None:
+                value = assignment.group(1).strip().strip("\"'")
+            values.append(value.strip())
+        if len(values) >= expected_lines:
+            stdin_text = "\n".join(values[:expected_lines]) + "\n"
+            if stdin_text not in inputs:
+                inputs.append(stdin_text)
+    return inputs
+
+
+def _details_hash(details):
+    return hashlib.sha256(details.encode("utf-8")).hexdigest()
+
+
+def _load_reference_cache():
+    try:
+        with open(SANDBOX_REFERENCE_CACHE, mode="r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_reference_cache(entries):
+    temporary = f"{SANDBOX_REFERENCE_CACHE}.{os.getpid()}.tmp"
+    with open(temporary, mode="w", encoding="utf-8") as file:
+        json.dump(entries, file)
+    os.replace(temporary, SANDBOX_REFERENCE_CACHE)
+
+
+async def compute_reference(details):
+    _, solution = split_solution(details)
+    inputs = extract_example_inputs(details, solution)
+    if not inputs:
+        return []
+    results = await run_many(solution, inputs)
+    return [
+        {"input": stdin_text, "output": result["stdout"]}
+        for stdin_text, result in zip(inputs, results)
+        if result["status"] == "ok" and result["stdout"].strip()
+    ]
+
+
+async def precompute_references(questions):
+    """Fill REFERENCE_OUTPUTS, reusing the on-disk cache for unchanged questions."""
+    if SANDBOX_MODE == "off":
+        return
+    started = time.perf_counter()
+    cached = _load_reference_cache()
+    entries = {}
+    for question_id, details in questions.items():
+        digest = _details_hash(details)
+        entry = cached.get(question_id)
+        if entry is None or entry["hash"] != digest:
+            entry = {"hash": digest, "examples": await compute_reference(details)}
+        entries[question_id] = entry
+        if entry["examples"]:
+            REFERENCE_OUTPUTS[question_id] = entry["examples"]
+    if entries != cached:
+        _save_reference_cache(entries)
+    metrics.SANDBOX_REFERENCE_QUESTIONS.set(len(REFERENCE_OUTPUTS))
+    print(
+        f"sandbox: reference outputs for {len(REFERENCE_OUTPUTS)} questions "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+
+async def refresh_references(questions, question_ids):
+    """Recompute the reference outputs of questions that were added, edited
+    or deleted in the catalogue."""
+    if SANDBOX_MODE == "off":
+        return
+    cached = _load_reference_cache()
+    for question_id in question_ids:
+        details = questions.get(question_id)
+        if details is None:
+            cached.pop(question_id, None)
+            REFERENCE_OUTPUTS.pop(question_id, None)
+            continue
+        entry = {"hash": _details_hash(details), "examples": await compute_reference(details)}
+        cached[question_id] = entry
+        if entry["examples"]:
+            REFERENCE_OUTPUTS[question_id] = entry["examples"]
+        else:
+            REFERENCE_OUTPUTS.pop(question_id, None)
+    _save_reference_cache(cached)
+    metrics.SANDBOX_REFERENCE_QUESTIONS.set(len(REFERENCE_OUTPUTS))
+
+
+def _normalize_output(text):
+    lines = [line.rstrip() for line in text.replace("\r\n", "\n").split("\n")]
+    while lines and not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def _clip(text, limit=300):
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+async def compare_with_reference(question_id, code):
+    """Run the student code on the reference examples of `question_id`.
+
+    Returns a list of per-example results, or None when the question has no
+    usable reference examples or the stage is off.
+    """
+    examples = REFERENCE_OUTPUTS.get(question_id)
+    if SANDBOX_MODE == "off" or not examples:
+        return None
+    started = time.perf_counter()
+    try:
+        results = await run_many(code, [example["input"] for example in examples])
+    except BrokenProcessPool:
+        shutdown()
+        return None
+    if any(result["status"] == "unavailable" for result in results):
+        # Never compared unconfined; the stage is skipped instead
+        print(f"sandbox: isolation unavailable: {results[0].get('message')}")
+        return None
+    comparisons = []
+    for example, result in zip(examples, results):
+        expected = _normalize_output(example["output"])
+        actual = _normalize_output(result.get("stdout", ""))
+        comparisons.append(
+            {
+                "input": example["input"],
+                "expected": example["output"],
+                "actual": result.get("stdout", ""),
+                "status": result["status"],
+                "error": result.get("error"),
+                "message": result.get("message"),
+                "line": result.get("line"),
+                "match": result["status"] == "ok" and expected == actual,
+                "diff": "\n".join(
+                    difflib.unified_diff(expected, actual, "expected", "student", lineterm="", n=1)
+                ),
+            }
+        )
+    outcome = "match" if all(item["match"] for item in comparisons) else "mismatch"
+    metrics.SANDBOX_SECONDS.labels(outcome=outcome).observe(time.perf_counter() - started)
+    return comparisons
+
+
+def all_match(comparisons):
+    return bool(comparisons) and all(item["match"] for item in comparisons)
+
+
+def answer(comparisons):
+    """Reply for code whose output matches the reference on every example."""
+    shown = comparisons[0]
+    return f"""<StudentResponse>
+Hi,
+
+I ran your code with this input from the question's example:
+
+```
+{_clip(shown['input'].rstrip())}
+```
+
+and it prints the expected output:
+
+```
+{_clip(shown['actual'].rstrip())}
+```
+
+Your code gives the correct output for all {len(comparisons)} example(s) in the question. If a test case still fails, check edge cases such as empty input, extra spaces or the largest and smallest values mentioned in the question.
+
+Mark the discussion as clarified if your issue is resolved.
+
+Happy Coding!
+</StudentResponse>"""
+
+
+def prompt_block(comparisons):
+    """Concise execution report so the model does not have to run the code mentally."""
+    if not comparisons:
+        return ""
+    lines = [
+        "\n<execution_results>",
+        "The student code and the reference solution were both run on the examples "
+        "below; use these results instead of executing the code mentally.",
+    ]
+    for number, item in enumerate(comparisons, 1):
+        lines.append(f"- example {number} input: {_clip(item['input'].strip())!r}")
+        if item["match"]:
+            lines.append("  result: output matches the reference solution")
+        elif item["status"] == "error":
+            location = f" on line {item['line']}" if item["line"] else ""
+            lines.append(f"  result: {item['error']}{location}: {_clip(item['message'] or '')}")
+        elif item["status"] != "ok":
+            lines.append(f"  result: {item['status']} (no complete output)")
+        else:
+            lines.append("  result: output differs from the reference solution")
+            lines.append("  diff:\n" + _clip(item["diff"], 600))
+    lines.append("</execution_results>\n")
+    return "\n".join(lines)
@@ -0,0 +1,24 @@
+import sqlite3
+import threading
+
+
+class SharedDatabase:
+    """SQLite database shared by every worker on the host (WAL mode).
+
+    Each process holds one autocommit connection guarded by a lock, so
+    subclasses may be called from asyncio.to_thread. `SCHEMA` is run on open.
+    """
+
+    SCHEMA = ""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(self.SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,82 @@
+import asyncio
+import os
+import time
+
+import metrics
+
+# "background": serve at once and warm up behind the readiness probe;
+# "blocking": finish warming up before accepting requests; "off": nothing
+# is warmed, everything is created on first use
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "background")
+# Seconds between attempts of a failed warm-up step. The worker stays unready
+# (and with "blocking", does not start serving) until every step succeeds
+STARTUP_RETRY_INTERVAL = float(os.getenv("STARTUP_RETRY_INTERVAL", "5"))
+
+_started = time.perf_counter()
+_checks = {}  # warm-up step -> finished
+_errors = {}  # warm-up step still failing -> its last error
+_ready_at = None
+
+
+def elapsed():
+    return time.perf_counter() - _started
+
+
+def imported(started):
+    """Record the end of the backend import, which began at `started`
+    (perf_counter), once the lifespan is entered."""
+    global _started
+    _started = started
+    metrics.STARTUP_SECONDS.labels(phase="import").set(elapsed())
+
+
+def ready():
+    return all(_checks.values())
+
+
+def status():
+    return {
+        "ready": ready(),
+        "checks": dict(_checks),
+        "errors": dict(_errors),
+        "readySeconds": _ready_at,
+    }
+
+
+def _mark_ready():
+    global _ready_at
+    _ready_at = round(elapsed(), 3)
+    metrics.STARTUP_SECONDS.labels(phase="ready").set(_ready_at)
+    print(f"startup: ready {_ready_at:.2f}s after import")
+
+
+async def _run(name, step):
+    started = time.perf_counter()
+    while True:
+        try:
+            await step()
+            break
+        except Exception as e:
+            # Not ready until it succeeds; /readyz reports the error meanwhile
+            _errors[name] = str(e) or type(e).__name__
+            metrics.STARTUP_STEP_FAILURES.labels(step=name).inc()
+            print(f"startup: warm-up step {name} failed, retrying in {STARTUP_RETRY_INTERVAL:g}s: {e}")
+        await asyncio.sleep(STARTUP_RETRY_INTERVAL)
+    _errors.pop(name, None)
+    metrics.STARTUP_STEP_SECONDS.labels(step=name).set(time.perf_counter() - started)
+    _checks[name] = True
+    if ready():
+        _mark_ready()
+
+
+async def warm(steps):
+    """Run the warm-up `steps` (name -> coroutine function) concurrently;
+    ready() turns true once all of them have finished."""
+    if STARTUP_WARMUP == "off":
+        steps = {}
+    for name in steps:
+        _checks[name] = False
+    if not steps:
+        _mark_ready()
+        return
+    await asyncio.gather(*(_run(name, step) for name, step in steps.items()))
@@ -0,0 +1,107 @@
+import json
+import re
+
+OPEN_TAG = "<StudentResponse>"
+CLOSE_TAG = "</StudentResponse>"
+ANALYSIS_BLOCK = re.compile(
+    r"<query_and_code_analysis>.*?(</query_and_code_analysis>|$)", re.DOTALL
+)
+
+
+def _partial_suffix(text, tag):
+    # Length of the longest suffix of `text` that is a prefix of `tag`
+    for size in range(min(len(tag) - 1, len(text)), 0, -1):
+        if tag.startswith(text[-size:]):
+            return size
+    return 0
+
+
+class StudentResponseFilter:
+    """Incrementally extract the text between <StudentResponse> tags.
+
+    Everything before the opening tag (the <query_and_code_analysis>
+    scratchpad) is held back. Text that might be the start of a tag split
+    across chunks is buffered until the next chunk decides it.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._raw = []
+        self.inside = False
+        self.opened = False
+        self.closed = False
+
+    def feed(self, text):
+        if not text or self.closed:
+            return ""
+        self._raw.append(text)
+        self._buffer += text
+        visible = []
+        while self._buffer:
+            if not self.inside:
+                start = self._buffer.find(OPEN_TAG)
+                if start == -1:
+                    keep = _partial_suffix(self._buffer, OPEN_TAG)
+                    self._buffer = self._buffer[len(self._buffer) - keep:]
+                    break
+                self._buffer = self._buffer[start + len(OPEN_TAG):]
+                self.inside = self.opened = True
+            else:
+                end = self._buffer.find(CLOSE_TAG)
+                if end == -1:
+                    keep = _partial_suffix(self._buffer, CLOSE_TAG)
+                    visible.append(self._buffer[: len(self._buffer) - keep])
+                    self._buffer = self._buffer[len(self._buffer) - keep:]
+                    break
+                visible.append(self._buffer[:end])
+                self._buffer = ""
+                self.inside = False
+                self.closed = True
+        return "".join(visible)
+
+    def finish(self):
+        """Flush what is left once the upstream stream has ended.
+
+        If the model never opened a <StudentResponse> block, fall back to the
+        raw completion with the analysis scratchpad stripped out.
+        """
+        if self.opened:
+            rest = self._buffer if self.inside else ""
+            self._buffer = ""
+            return rest
+        self._buffer = ""
+        return ANALYSIS_BLOCK.sub("", "".join(self._raw)).strip()
+
+    @property
+    def raw_text(self):
+        return "".join(self._raw)
+
+
+async def until_closed(deltas, on_stop=None):
+    """Pass deltas through up to the closing </StudentResponse> tag, then
+    close `deltas` so the rest of the generation is not waited or paid for."""
+    response_filter = StudentResponseFilter()
+    sent = 0
+    try:
+        async for delta in deltas:
+            response_filter.feed(delta)
+            if response_filter.closed:
+                raw = response_filter.raw_text
+                end = raw.index(CLOSE_TAG, raw.index(OPEN_TAG) + len(OPEN_TAG)) + len(CLOSE_TAG)
+                if end > sent:
+                    yield raw[sent:end]
+                if on_stop is not None:
+                    on_stop()
+                return
+            sent += len(delta)
+            yield delta
+    finally:
+        await deltas.aclose()
+
+
+def sse_event(data, event=None):
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
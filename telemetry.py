@@ -0,0 +1,133 @@
+import contextvars
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+from starlette.responses import JSONResponse
+
+import deadlines
+import metrics
+
+# Spans are only emitted when the OpenTelemetry API is installed and
+# OTEL_ENABLED=1; exporters are configured the usual OTEL_* way
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "0") == "1" and trace is not None
+_tracer = trace.get_tracer("pymebot") if OTEL_ENABLED else None
+
+REQUEST_ID_HEADER = "X-Request-Id"
+REQUEST_ID = contextvars.ContextVar("request_id", default=None)
+ENDPOINT = contextvars.ContextVar("endpoint", default="other")
+
+# Paths whose stages are broken down in pymebot_stage_seconds
+_ENDPOINTS = {
+    "/api/submit": "submit",
+    "/api/submit/stream": "stream",
+    "/api/submit/batch": "batch",
+    "/api/jobs": "jobs",
+    "/api/questions/search": "search",
+}
+
+
+def request_headers():
+    """Headers that carry the request id and deadline to the upstream provider."""
+    headers = {}
+    request_id = REQUEST_ID.get()
+    if request_id:
+        headers[REQUEST_ID_HEADER] = request_id
+    deadline = deadlines.epoch()
+    if deadline is not None:
+        headers[deadlines.DEADLINE_HEADER] = f"{deadline:.3f}"
+    return headers
+
+
+@contextmanager
+def stage(name):
+    """Time one stage of the current request, in a span when tracing is on."""
+    endpoint = ENDPOINT.get()
+    started = time.perf_counter()
+    try:
+        if _tracer is None:
+            yield
+        else:
+            with _tracer.start_as_current_span(name) as span:
+                span.set_attribute("pymebot.request_id", REQUEST_ID.get() or "")
+                span.set_attribute("pymebot.endpoint", endpoint)
+                yield
+    finally:
+        metrics.STAGE_SECONDS.labels(endpoint=endpoint, stage=name).observe(time.perf_counter() - started)
+
+
+async def timed_stream(deltas):
+    """Pass deltas through, recording upstream time to first token and total."""
+    endpoint = ENDPOINT.get()
+    started = time.perf_counter()
+    first = True
+    try:
+        async for delta in deltas:
+            if first:
+                first = False
+                metrics.STAGE_SECONDS.labels(endpoint=endpoint, stage="upstream_ttft").observe(
+                    time.perf_counter() - started
+                )
+            yield delta
+    finally:
+        metrics.STAGE_SECONDS.labels(endpoint=endpoint, stage="upstream_total").observe(
+            time.perf_counter() - started
+        )
+
+
+class RequestContextMiddleware:
+    """ASGI middleware giving every request an id (taken from X-Request-Id
+    when the caller sends one), echoing it in the response and counting the
+    requests in flight per endpoint. It also sets the request's deadline
+    and turns away requests that arrive after it."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request_id = deadline = timeout = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+            elif name == b"x-request-deadline":
+                deadline = value.decode("latin-1")
+            elif name == b"x-request-timeout":
+                timeout = value.decode("latin-1")
+        request_id = request_id or uuid.uuid4().hex
+        endpoint = _ENDPOINTS.get(scope["path"], "other")
+        request_token = REQUEST_ID.set(request_id)
+        endpoint_token = ENDPOINT.set(endpoint)
+        deadline_token = deadlines.DEADLINE.set(deadlines.from_headers(deadline, timeout))
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-request-id", request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        in_flight = metrics.REQUESTS_IN_FLIGHT.labels(endpoint=endpoint)
+        in_flight.inc()
+        try:
+            if deadlines.expired():
+                error = deadlines.exceeded("arrival")
+                await JSONResponse({"detail": str(error)}, status_code=504)(scope, receive, send_with_id)
+            elif _tracer is None:
+                await self.app(scope, receive, send_with_id)
+            else:
+                with _tracer.start_as_current_span(f"{scope['method']} {scope['path']}") as span:
+                    span.set_attribute("pymebot.request_id", request_id)
+                    await self.app(scope, receive, send_with_id)
+        finally:
+            in_flight.dec()
+            REQUEST_ID.reset(request_token)
+            ENDPOINT.reset(endpoint_token)
+            deadlines.DEADLINE.reset(deadline_token)
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+import budgets
+from resilience import UpstreamUnavailable
+
+
+def answer(complete):
+    return asyncio.run(budgets.answer([{"role": "user", "content": "help"}], "code_review", complete))
+
+
+def test_answer_wraps_first_reply_when_repair_fails():
+    calls = []
+
+    async def complete(messages, params):
+        calls.append(messages)
+        if len(calls) == 1:
+            return "Use a loop over the list."
+        raise UpstreamUnavailable("no model available", 5)
+
+    text, outcome = answer(complete)
+    assert len(calls) == 2
+    assert text == f"{budgets.OPEN_TAG}\nUse a loop over the list.\n{budgets.CLOSE_TAG}"
+    assert outcome == "fallback"
+
+
+def test_answer_uses_repaired_reply():
+    replies = iter(["no tags here", "<StudentResponse>\nFixed.\n</StudentResponse>"])
+
+    async def complete(messages, params):
+        return next(replies)
+
+    assert answer(complete) == ("<StudentResponse>\nFixed.\n</StudentResponse>", "repaired")
+
+
+def test_answer_cut_off_inside_the_analysis_is_empty():
+    replies = iter(["<query_and_code_analysis>\nThe student", "<StudentResponse>\nThe"])
+
+    async def complete(messages, params):
+        if messages[-1]["content"] == budgets.REPAIR_INSTRUCTION:
+            raise UpstreamUnavailable("no model available", 5)
+        return next(replies)
+
+    with pytest.raises(budgets.EmptyAnswer):
+        answer(complete)
+
+
+def test_answer_cut_off_inside_the_response_is_truncated():
+    async def complete(messages, params):
+        return "<query_and_code_analysis>ok</query_and_code_analysis>\n<StudentResponse>\nHi, your loop"
+
+    text, outcome = answer(complete)
+    assert outcome == "truncated" and outcome not in budgets.CACHEABLE_OUTCOMES
+    assert budgets.body(text) == "Hi, your loop"
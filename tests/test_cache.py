@@ -0,0 +1,52 @@
+import asyncio
+import sqlite3
+
+from cache import ResponseCache
+
+CODE = "n = int(input())\nprint(n * 2)"
+RENAMED = "value = int(input())\nprint(value * 2)"
+OTHER = "print(input())"
+
+
+def degraded_answer(cache, query, code):
+    async def run():
+        lookup = await cache.lookup_submission("q1", query, code)
+        return await cache.degraded_answer("q1", query, lookup.fingerprint)
+
+    return asyncio.run(run())
+
+
+def store(cache, query, code, response):
+    async def run():
+        lookup = await cache.lookup_submission("q1", query, code)
+        await cache.store_submission("q1", query, lookup, response)
+
+    asyncio.run(run())
+
+
+def test_degraded_answer_prefers_same_program_then_same_query(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    store(cache, "why is my output wrong?", CODE, "Multiply `n` by two.")
+
+    # Same program asked differently: the answer, in the student's own names
+    assert degraded_answer(cache, "what is the bug", RENAMED) == "Multiply `value` by two."
+    # Different program, same query
+    assert degraded_answer(cache, "Why is my output  wrong?", OTHER) == "Multiply `n` by two."
+    # Nothing related: never another student's answer
+    assert degraded_answer(cache, "how do i start", OTHER) is None
+    cache.close()
+
+
+def test_existing_database_gains_the_degraded_columns(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE responses (key TEXT PRIMARY KEY, question_id TEXT NOT NULL, response TEXT NOT NULL, "
+        "created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+    )
+    conn.close()
+
+    cache = ResponseCache(path)
+    store(cache, "why is my output wrong?", CODE, "Multiply `n` by two.")
+    assert degraded_answer(cache, "why is my output wrong?", OTHER) == "Multiply `n` by two."
+    cache.close()
@@ -0,0 +1,51 @@
+import csv
+import os
+
+import pytest
+
+import budgets
+import classifier
+
+CATALOGUE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "questions.csv")
+MARKS = "81860568-b701-455c-a818-171be4f37362"  # PASS or FAIL from the student's marks
+PASSWORD = "c8a2c1a4-1013-448c-8ec9-193f07ef8127"  # is the given password valid
+EXAM = "506b9608-ec59-4399-93b9-8c5de1e3538c"  # "Allowed to write exam"
+
+
+@pytest.fixture(scope="module")
+def questions():
+    with open(CATALOGUE, mode="r", encoding="utf-8") as file:
+        return {row["question_id"]: row["question_details"] for row in csv.DictReader(file)}
+
+
+@pytest.mark.parametrize(
+    "question_id, query",
+    [
+        (MARKS, "how to sort the marks in descending order"),
+        (MARKS, "how to find the highest marks"),
+        (MARKS, "what if the marks are 35"),
+        (PASSWORD, "what should the password contain"),
+        (PASSWORD, "password with a space is accepted"),
+        (EXAM, "exam marks"),
+        (EXAM, "when is the student allowed to the exam"),
+    ],
+)
+def test_exercise_topics_reach_the_model(questions, question_id, query):
+    details = questions[question_id]
+    assert classifier.is_out_of_scope(query, details) is None
+    assert budgets.categorize(query, "", details) != "out_of_scope"
+
+
+@pytest.mark.parametrize(
+    "query, category",
+    [
+        ("when is the exam scheduled", "portal"),
+        ("i forgot my password", "portal"),
+        ("my marks are not updated yet", "administrative"),
+        ("i am not able to access the next session", "portal"),
+    ],
+)
+def test_portal_queries_stay_out_of_scope(questions, query, category):
+    # The question's statement has none of these keywords
+    result = classifier.is_out_of_scope(query, questions[PASSWORD if "marks" in query else MARKS])
+    assert result is not None and result.category == category
@@ -0,0 +1,35 @@
+import asyncio
+import os
+import signal
+import time
+
+from prometheus_client import REGISTRY
+
+import diagnostics
+
+
+def observed(outcome):
+    return REGISTRY.get_sample_value("pymebot_diagnostics_seconds_count", {"outcome": outcome}) or 0
+
+
+def test_broken_pool_is_reported_and_rebuilt():
+    async def run():
+        assert await diagnostics.diagnose("pass") is None
+        broken = diagnostics._pool
+        for pid in list(broken._processes):
+            os.kill(pid, signal.SIGKILL)
+        # Give the executor's management thread time to notice
+        deadline = time.monotonic() + 5
+        while not broken._broken and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        timeouts, pool_errors = observed("timeout"), observed("pool_error")
+        assert await diagnostics.diagnose("x = (") is None
+        assert (observed("timeout"), observed("pool_error")) == (timeouts, pool_errors + 1)
+        assert diagnostics._pool is not broken
+        return await diagnostics.diagnose("x = (")
+
+    try:
+        diagnostic = asyncio.run(run())
+    finally:
+        diagnostics.shutdown()
+    assert diagnostic["type"] == "SyntaxError"
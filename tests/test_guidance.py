@@ -0,0 +1,49 @@
+from guidance import is_starter_code
+
+SOLUTION = """def number_of_cars_needed(no_of_people):
+    no_of_cars = no_of_people // 5
+    remaining_people = no_of_people % 5
+    if remaining_people > 0:
+        no_of_cars += 1
+    print(no_of_cars)
+
+no_of_people = int(input())
+number_of_cars_needed(no_of_people)"""
+DETAILS = "Write a function that returns how many cars are needed.\n\nSolution Code:" + SOLUTION
+
+
+def test_empty_and_comment_only_code_is_starter():
+    assert is_starter_code("", DETAILS)
+    assert is_starter_code("# write your code here\n", DETAILS)
+
+
+def test_stub_with_driver_lines_is_starter():
+    code = """def number_of_cars_needed(no_of_people):
+    # write your code here
+    pass
+
+no_of_people = int(input())
+number_of_cars_needed(no_of_people)"""
+    assert is_starter_code(code, DETAILS)
+
+
+def test_reference_solution_is_not_starter():
+    assert not is_starter_code(SOLUTION, DETAILS)
+
+
+def test_reference_logic_at_top_level_is_not_starter():
+    code = """no_of_people = int(input())
+no_of_cars = no_of_people // 5
+remaining_people = no_of_people % 5
+print(no_of_cars)"""
+    details = "Print how many cars are needed.\n\nSolution Code:" + code
+    assert not is_starter_code(code, details)
+
+
+def test_own_function_body_is_not_starter():
+    code = """def number_of_cars_needed(no_of_people):
+    print(no_of_people // 5)
+
+no_of_people = int(input())
+number_of_cars_needed(no_of_people)"""
+    assert not is_starter_code(code, DETAILS)
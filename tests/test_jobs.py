@@ -0,0 +1,37 @@
+import asyncio
+
+from jobs import JobQueue
+
+
+async def handler(job):
+    return {}, {}
+
+
+def test_wait_forgets_jobs_run_elsewhere(tmp_path):
+    async def run():
+        queue = JobQueue(handler, path=str(tmp_path / "jobs.sqlite3"))
+        # Nobody here runs the job, so every wait times out
+        await asyncio.gather(queue.wait("remote", 0.01), queue.wait("remote", 0.05))
+        return queue
+
+    queue = run_and_close(run)
+    assert queue._watchers == {} and not queue._waiters
+
+
+def test_notify_wakes_every_waiter(tmp_path):
+    async def run():
+        queue = JobQueue(handler, path=str(tmp_path / "jobs.sqlite3"))
+        waiters = [asyncio.create_task(queue.wait("local", 5)) for _ in range(2)]
+        await asyncio.sleep(0)
+        queue._notify("local")
+        await asyncio.wait_for(asyncio.gather(*waiters), 1)
+        return queue
+
+    queue = run_and_close(run)
+    assert queue._watchers == {} and not queue._waiters
+
+
+def run_and_close(main):
+    queue = asyncio.run(main())
+    queue.close()
+    return queue
@@ -0,0 +1,29 @@
+import question_store
+
+ROWS = 'question_id,question_details\nq3,Third\nq1,"First, with a comma"\nq2,Second'
+
+
+def test_apply_changes_preserves_csv_row_order(tmp_path):
+    csv_path = tmp_path / "questions.csv"
+    store_path = str(tmp_path / "questions.store")
+    csv_path.write_text(ROWS, encoding="utf-8")
+    question_store.ensure_store(str(csv_path), store_path)
+
+    store = question_store.apply_changes({"q1": "First, edited", "q4": "Fourth"}, ["q2"], str(csv_path), store_path)
+
+    assert csv_path.read_text(encoding="utf-8") == (
+        'question_id,question_details\nq3,Third\nq1,"First, edited"\nq4,Fourth'
+    )
+    assert store.get("q1") == "First, edited" and "q2" not in store
+    assert store.version("q1") == 2 and store.version("q3") == 1
+    store.close()
+
+
+def test_unchanged_csv_is_rewritten_byte_for_byte(tmp_path):
+    csv_path = tmp_path / "questions.csv"
+    csv_path.write_text(ROWS + "\n", encoding="utf-8")
+    question_store.ensure_store(str(csv_path), str(tmp_path / "questions.store"))
+
+    question_store.apply_changes({}, [], str(csv_path), str(tmp_path / "questions.store")).close()
+
+    assert csv_path.read_text(encoding="utf-8") == ROWS + "\n"
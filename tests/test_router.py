@@ -0,0 +1,191 @@
+"""Router hedging, failover and breakers against bench.mock_upstream servers
+with scripted latency profiles."""
+import asyncio
+import threading
+import time
+
+import httpx
+import openai  # noqa: F401  (imported up front so no test times the SDK import)
+import pytest
+import uvicorn
+
+import resilience
+import router
+import upstream
+from bench.mock_upstream import create_app
+from bench.run import free_port
+
+MESSAGES = [{"role": "user", "content": "why is my output wrong?"}]
+
+
+class MockServer:
+    def __init__(self, **options):
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}/v1"
+        config = uvicorn.Config(create_app(seed=0, **options), port=self.port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join()
+
+    def requests(self):
+        return httpx.get(f"http://127.0.0.1:{self.port}/stats").json()["requests"]
+
+
+@pytest.fixture(scope="module")
+def servers():
+    started = {
+        "fast": MockServer(latency="fixed:0.05", chunk_rate=0).start(),
+        "slow": MockServer(latency="fixed:1.5", chunk_rate=0).start(),
+        "failing": MockServer(latency="fixed:0.01", error_rate=1.0).start(),
+    }
+    yield started
+    for server in started.values():
+        server.stop()
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test")
+    monkeypatch.setattr(resilience, "UPSTREAM_RETRIES", 0)
+    monkeypatch.setattr(router, "ROUTER_HEDGE_ENABLED", True)
+    monkeypatch.setattr(router, "ROUTER_MIN_HEDGE_DELAY", 0.1)
+
+
+def run(coroutine):
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            # The shared pool belongs to this test's event loop
+            await upstream.close_client()
+
+    return asyncio.run(main())
+
+
+def make_router(*base_urls):
+    return router.Router([router.Endpoint(f"model-{index}", url) for index, url in enumerate(base_urls)])
+
+
+def measured(stats, seconds):
+    # Gives a model a full latency window, so its p95 sets the hedge delay
+    for _ in range(router.ROUTER_MIN_SAMPLES):
+        stats.record(seconds, True)
+
+
+def test_hedge_fires_after_primary_p95(servers):
+    models = make_router(servers["slow"].base_url, servers["fast"].base_url)
+    slow, fast = models.models
+    measured(slow, 0.2)
+
+    started = time.perf_counter()
+    text = run(models.complete(MESSAGES))
+    elapsed = time.perf_counter() - started
+
+    assert "<StudentResponse>" in text
+    # Hedged after the 0.2 s p95 and answered by the fast model, well
+    # before the slow one's 1.5 s
+    assert 0.2 <= elapsed < 1.0
+    assert len(fast.latencies) == 1
+    # The cancelled primary is recorded as having taken at least the race
+    assert slow.latencies[-1] >= 0.2
+
+
+def test_losing_stream_is_cancelled_and_its_slot_released(servers):
+    models = make_router(servers["slow"].base_url, servers["fast"].base_url)
+    measured(models.models[0], 0.2)
+
+    async def read():
+        started = time.perf_counter()
+        text = "".join([delta async for delta in models.stream(MESSAGES)])
+        await asyncio.sleep(0.05)
+        # Checked before the event loop closes and would cancel leftovers
+        pending = [task for task in asyncio.all_tasks() if not task.done()]
+        return text, time.perf_counter() - started, pending, upstream._in_flight._value
+
+    text, elapsed, tasks, free_slots = run(read())
+
+    assert "</StudentResponse>" in text
+    assert elapsed < 1.0
+    # Only the test itself is left running, and every in-flight slot is free
+    assert len(tasks) == 1
+    assert free_slots == upstream.UPSTREAM_MAX_IN_FLIGHT
+    assert all(not stats.breaker.trial_running for stats in models.models)
+
+
+def test_loser_answering_in_the_same_round_is_released(servers):
+    models = make_router(servers["fast"].base_url, servers["fast"].base_url)
+    measured(models.models[0], 0.05)
+    both_started = asyncio.Event()
+    launched = []
+    released = []
+
+    async def start(stats, messages):
+        launched.append(stats)
+        if len(launched) == 2:
+            both_started.set()
+        await both_started.wait()
+        return stats.endpoint.model
+
+    async def release(result):
+        released.append(result)
+
+    winner, stats = run(models._race(start, MESSAGES, release))
+
+    assert len(launched) == 2
+    assert released == [model for model in ("model-0", "model-1") if model != winner]
+
+
+def test_failover_on_non_retryable_error(servers):
+    # The path does not exist on the mock: a 404, which retrying cannot fix
+    missing = servers["fast"].base_url.replace("/v1", "/missing/v1")
+    models = make_router(missing, servers["fast"].base_url)
+    broken, fast = models.models
+
+    started = time.perf_counter()
+    text = run(models.complete(MESSAGES))
+
+    assert "<StudentResponse>" in text
+    # Failed over at once instead of waiting for the hedge delay
+    assert time.perf_counter() - started < router.ROUTER_HEDGE_DELAY
+    assert broken.error_rate() == 1.0
+    # A bad request says nothing about the model's health
+    assert broken.breaker.state == resilience.CLOSED and broken.breaker.failures == 0
+    assert len(fast.latencies) == 1
+
+
+def test_open_breaker_is_skipped(servers, monkeypatch):
+    monkeypatch.setattr(resilience, "BREAKER_FAILURE_THRESHOLD", 1)
+    models = make_router(servers["failing"].base_url, servers["slow"].base_url)
+    failing, slow = models.models
+    calls_before = servers["failing"].requests()
+
+    # A 500 fails over to the other model and opens the breaker
+    assert "<StudentResponse>" in run(models.complete(MESSAGES))
+    assert failing.breaker.state == resilience.OPEN
+    assert servers["failing"].requests() == calls_before + 1
+
+    # The slow model would be hedged on the failing one after 0.2 s, but an
+    # open breaker takes it out of the race without a call
+    measured(slow, 0.2)
+    assert "<StudentResponse>" in run(models.complete(MESSAGES))
+    assert servers["failing"].requests() == calls_before + 1
+
+
+def test_every_breaker_open_is_unavailable(servers, monkeypatch):
+    monkeypatch.setattr(resilience, "BREAKER_FAILURE_THRESHOLD", 1)
+    models = make_router(servers["failing"].base_url)
+
+    with pytest.raises(resilience.UpstreamUnavailable):
+        run(models.complete(MESSAGES))
+    with pytest.raises(resilience.UpstreamUnavailable) as raised:
+        run(models.complete(MESSAGES))
+    assert raised.value.retry_after > 0
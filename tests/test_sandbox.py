@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+import sandbox
+
+# Reaches os without importing it, the way escaping code would
+REACH_OS = """
+os = next(c for c in ().__class__.__base__.__subclasses__() if c.__name__ == "_wrap_close").__init__.__globals__
+"""
+
+
+def run(code):
+    result = sandbox.run_program(code, "")
+    if result["status"] == "unavailable":
+        pytest.skip(f"sandbox isolation unavailable: {result.get('message')}")
+    return result
+
+
+def test_allowed_modules_hide_their_internals():
+    result = run("import random, datetime\nprint(random.randint(1, 1), hasattr(random, '_os'), hasattr(datetime, 'sys'))")
+    assert result["stdout"] == "1 False False\n"
+
+    result = run("import collections.abc\nfrom random import _os")
+    assert result["status"] == "error" and result["error"] == "ImportError"
+
+
+def test_inherited_fds_are_closed():
+    # Stands in for the pool's result queue pipe
+    read_fd, write_fd = os.pipe()
+    os.set_blocking(read_fd, False)
+    try:
+        result = run(
+            REACH_OS
+            + f"""
+open_fds = []
+for fd in range(256):
+    try:
+        os["fstat"](fd)
+        open_fds.append(fd)
+    except OSError:
+        pass
+print(open_fds)
+os["write"]({write_fd}, b"forged")
+"""
+        )
+        # stdio on /dev/null and the result pipe, nothing else
+        assert len(eval(result["stdout"])) == 4
+        assert result["error"] == "OSError"
+        with pytest.raises(BlockingIOError):
+            os.read(read_fd, 64)
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
@@ -0,0 +1,149 @@
+import asyncio
+import importlib
+import os
+
+import httpx
+
+import deadlines
+import metrics
+import telemetry
+
+# Upstream (OpenRouter) connection settings, overridable from the environment
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+UPSTREAM_MODEL = os.getenv("UPSTREAM_MODEL", "deepseek/deepseek-r1-zero:free")
+UPSTREAM_MAX_IN_FLIGHT = int(os.getenv("UPSTREAM_MAX_IN_FLIGHT", "256"))
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "256"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "64"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "60"))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "10"))
+UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "180"))
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "0") == "1"
+
+_clients = {}  # base URL -> AsyncOpenAI, all sharing one connection pool
+_http_client = None
+# Bounds the number of upstream calls a single worker has in flight at once
+_in_flight = asyncio.Semaphore(UPSTREAM_MAX_IN_FLIGHT)
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_timeout(read=None, connect=None):
+    # Never wait on the provider past the request's deadline
+    connect = deadlines.timeout(connect or UPSTREAM_CONNECT_TIMEOUT)
+    read = deadlines.timeout(read or UPSTREAM_READ_TIMEOUT)
+    return httpx.Timeout(connect=connect, read=read, write=connect, pool=read)
+
+
+def get_client(base_url=None):
+    """Return the shared async client for `base_url` (OpenRouter by default),
+    creating the connection pool on first use."""
+    global _http_client
+    base_url = base_url or OPENROUTER_BASE_URL
+    if _http_client is None:
+        # HTTP/2 needs the optional `h2` package (pip install httpx[http2])
+        http2 = UPSTREAM_HTTP2 and _http2_available()
+        _http_client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+                keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=build_timeout(),
+        )
+    client = _clients.get(base_url)
+    if client is None:
+        # The SDK takes most of a second to import; nothing needs it before
+        # the first upstream call (or warm())
+        from openai import AsyncOpenAI
+
+        client = _clients[base_url] = AsyncOpenAI(
+            base_url=base_url,
+            api_key=os.getenv("OPENROUTER_API_KEY"),  # Load API key from environment
+            http_client=_http_client,
+            # Retries are handled by resilience.with_retries
+            max_retries=0,
+        )
+    return client
+
+
+async def warm(base_urls):
+    """Import the SDK off the event loop, create the clients for `base_urls`
+    and open a connection to each provider so the first answer does not pay
+    for the TLS handshake. Raises ConnectionError naming the providers that
+    could not be reached."""
+    await asyncio.to_thread(importlib.import_module, "openai")
+    unreachable = []
+    for base_url in base_urls:
+        base_url = base_url or OPENROUTER_BASE_URL
+        get_client(base_url)
+        try:
+            # Any response will do: the connection stays in the keep-alive pool
+            await _http_client.head(f"{base_url}/models", timeout=build_timeout(read=UPSTREAM_CONNECT_TIMEOUT))
+        except httpx.HTTPError as e:
+            unreachable.append(f"{base_url} ({e or type(e).__name__})")
+    if unreachable:
+        raise ConnectionError(f"cannot reach {', '.join(unreachable)}")
+
+
+async def close_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+    _clients.clear()
+    _http_client = None
+
+
+async def create_completion(messages, model=None, read_timeout=None, base_url=None, **kwargs):
+    """Run one chat completion through the shared pool.
+
+    At most UPSTREAM_MAX_IN_FLIGHT calls run concurrently per worker; the rest
+    wait on the semaphore without blocking the event loop.
+    """
+    async with _in_flight:
+        metrics.UPSTREAM_IN_FLIGHT.inc()
+        try:
+            return await get_client(base_url).chat.completions.create(
+                model=model or UPSTREAM_MODEL,
+                messages=messages,
+                timeout=build_timeout(read=read_timeout),
+                extra_headers=telemetry.request_headers(),
+                **kwargs,
+            )
+        finally:
+            metrics.UPSTREAM_IN_FLIGHT.dec()
+
+
+async def stream_completion(messages, model=None, read_timeout=None, base_url=None, **kwargs):
+    """Yield content deltas of a streamed chat completion as they arrive.
+
+    The in-flight slot is held until the stream is exhausted or closed.
+    """
+    async with _in_flight:
+        metrics.UPSTREAM_IN_FLIGHT.inc()
+        try:
+            stream = await get_client(base_url).chat.completions.create(
+                model=model or UPSTREAM_MODEL,
+                messages=messages,
+                stream=True,
+                timeout=build_timeout(read=read_timeout),
+                extra_headers=telemetry.request_headers(),
+                **kwargs,
+            )
+            try:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        yield delta
+            finally:
+                await stream.close()
+        finally:
+            metrics.UPSTREAM_IN_FLIGHT.dec()